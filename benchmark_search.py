@@ -0,0 +1,126 @@
+"""Micro-benchmark for Boolean query evaluation on a synthetic resume corpus.
+
+Compares the previous per-document evaluate_expression (patterns rebuilt for every
+term x document x recursion level) with CompiledQuery (compiled once per query).
+
+    python benchmark_search.py --docs 10000
+"""
+import argparse
+import random
+import re
+import time
+
+from boolean.boolean import Symbol, AND, OR
+
+from final_retriever import BooleanSearchParser, CompiledQuery, compute_search_tokens
+
+SKILLS = [
+    "Python", "Java", "JavaScript", "TypeScript", "React", "Node.js", "Django", "Flask", "FastAPI",
+    "AWS", "Azure", "GCP", "Docker", "Kubernetes", "Terraform", "PostgreSQL", "MongoDB", "Redis",
+    "Machine Learning", "Deep Learning", "PyTorch", "TensorFlow", "HuggingFace", "Spark", "Kafka",
+    "Go", "Rust", "C++", ".NET", "GraphQL", "REST APIs", "CI/CD", "Linux", "Pandas", "NumPy",
+]
+WORDS = (
+    "built designed implemented scalable service pipeline platform dashboard data model api "
+    "microservice automated deployed optimized latency throughput users reporting analytics "
+    "integration migration cloud realtime streaming inference training evaluation testing"
+).split()
+QUERIES = [
+    "Python",
+    "Python AND Django",
+    "JavaScript OR TypeScript",
+    "(Python OR Java) AND (AWS OR Azure)",
+    "Machine Learning AND PyTorch",
+    "kubernetes AND (terraform OR docker) AND go",
+]
+
+
+def synthetic_resume(rng: random.Random, i: int) -> dict:
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(12)) + " using " + rng.choice(SKILLS)
+
+    return {
+        "name": f"Candidate {i}",
+        "email": f"candidate{i}@example.com",
+        "summary": sentence(),
+        "skills": rng.sample(SKILLS, rng.randint(4, 12)),
+        "experience": [
+            {"title": "Engineer", "company": f"Company {rng.randint(1, 500)}", "description": sentence()}
+            for _ in range(rng.randint(1, 4))
+        ],
+        "projects": [
+            {"title": f"Project {j}", "description": " ".join(sentence() for _ in range(3))}
+            for j in range(rng.randint(1, 5))
+        ],
+    }
+
+
+def legacy_evaluate(expr, text, quoted_phrases=None):
+    """evaluate_expression as it was before CompiledQuery, kept here as the baseline."""
+    quoted_phrases = quoted_phrases or {}
+    if isinstance(expr, Symbol):
+        term = str(expr.obj).lower()
+        if term.startswith("QUOTED_PHRASE_") and term in quoted_phrases:
+            return quoted_phrases[term].lower() in text
+        pattern = r'\b' + re.escape(term) + r'\b'
+        if len(term) <= 4:
+            return bool(re.search(pattern, text))
+        if re.search(pattern, text):
+            return True
+        return term in text
+    elif isinstance(expr, AND):
+        for arg in expr.args:
+            if isinstance(arg, Symbol):
+                term = str(arg.obj).lower()
+                if not re.search(r'\b' + re.escape(term) + r'\b', text):
+                    return False
+            elif not legacy_evaluate(arg, text, quoted_phrases):
+                return False
+        return True
+    elif isinstance(expr, OR):
+        return any(legacy_evaluate(arg, text, quoted_phrases) for arg in expr.args)
+    return False
+
+
+def parse(query: str):
+    bsp = BooleanSearchParser()
+    if "AND" in query or "OR" in query:
+        return bsp.parse_query(query), bsp.quoted_phrases
+    return Symbol(query.lower()), {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=10000, help="Number of synthetic resumes")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"🧪 Normalizing {args.docs} synthetic resumes...")
+    # Resumes as stored in MongoDB: the search_tokens list of each document
+    stored = [compute_search_tokens(synthetic_resume(rng, i)) for i in range(args.docs)]
+
+    print(f"\n{'query':<45} {'hits':>6} {'before µs/doc':>14} {'after µs/doc':>13} {'speedup':>8}")
+    for query in QUERIES:
+        expr, phrases = parse(query)
+
+        # Both sides include rebuilding the per-document text, as the retriever does
+        start = time.perf_counter()
+        before = [legacy_evaluate(expr, " ".join(tokens), phrases) for tokens in stored]
+        before_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = CompiledQuery(expr, phrases)
+        after = [matcher.matches(" ".join(tokens), tokens) for tokens in stored]
+        after_time = time.perf_counter() - start
+
+        if before != after:
+            print(f"❌ Results differ for {query!r}")
+        per_doc_before = before_time / len(stored) * 1e6
+        per_doc_after = after_time / len(stored) * 1e6
+        print(f"{query:<45} {sum(after):>6} {per_doc_before:>14.2f} {per_doc_after:>13.2f} "
+              f"{before_time / after_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
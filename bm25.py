@@ -0,0 +1,164 @@
+import math
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+from final_retriever import DERIVED_FIELDS, flatten_json, tokenize
+
+# Resume sections scored as separate BM25F fields, and how much a hit in each counts
+FIELD_WEIGHTS = {
+    "skills": 3.0,
+    "project_titles": 2.0,
+    "experience": 1.5,
+    "summary": 1.0,
+    "projects": 1.0,
+    "other": 0.5,
+}
+K1 = 1.2
+# Length normalization per field; skills lists are short and uniform, so barely normalized
+FIELD_B = {"skills": 0.3, "project_titles": 0.5}
+DEFAULT_B = 0.75
+
+
+def field_texts(resume: dict) -> Dict[str, str]:
+    """Split a resume's content into the FIELD_WEIGHTS sections."""
+    parts: Dict[str, List[str]] = {field: [] for field in FIELD_WEIGHTS}
+    for key, value in resume.items():
+        if key in DERIVED_FIELDS or key == "_id":
+            continue
+        if key in ("skills", "summary", "experience"):
+            parts[key].append(flatten_json(value))
+        elif key == "projects" and isinstance(value, list):
+            for project in value:
+                if isinstance(project, dict):
+                    parts["project_titles"].append(flatten_json(project.get("title")))
+                    parts["projects"].append(flatten_json({k: v for k, v in project.items() if k != "title"}))
+                else:
+                    parts["projects"].append(flatten_json(project))
+        else:
+            parts["other"].append(flatten_json(value))
+    return {field: " ".join(texts) for field, texts in parts.items() if any(texts)}
+
+
+def field_term_counts(resume: dict) -> Dict[str, Dict[str, int]]:
+    """Per-field term frequencies ({field: {token: count}}), stored as the `field_tf` derived field."""
+    counts = {}
+    for field, text in field_texts(resume).items():
+        tokens = tokenize(text)
+        if tokens:
+            counts[field] = dict(Counter(tokens))
+    return counts
+
+
+def field_lengths(field_tf: dict) -> Dict[str, int]:
+    return {field: sum(counts.values()) for field, counts in (field_tf or {}).items()}
+
+
+def query_tokens(term: str) -> List[str]:
+    """Index tokens a query term is scored on: two-word phrases use their merged
+    bigram ("machine learning" -> "machinelearning"), longer ones every word."""
+    words = tokenize(term, bigrams=False)
+    if len(words) == 2:
+        return [words[0] + words[1]]
+    return words
+
+
+class CorpusStats:
+    """Document count, document frequencies and average field lengths BM25F needs.
+
+    `containing` lists the indexed tokens that contain a term and `any_frequency` counts
+    documents holding any of several tokens; both are only needed to score substring-matched terms.
+    """
+
+    def __init__(self, doc_count: int, document_frequency: Callable[[str], int], field_length_totals: Dict[str, int],
+                 containing: Optional[Callable[[str], Iterable[str]]] = None,
+                 any_frequency: Optional[Callable[[Iterable[str]], int]] = None):
+        self.doc_count = doc_count
+        self.document_frequency = document_frequency
+        self.containing = containing
+        self.any_frequency = any_frequency
+        self.avg_field_length = {
+            field: total / doc_count for field, total in field_length_totals.items() if doc_count and total
+        }
+
+    @classmethod
+    def from_documents(cls, docs: Iterable[dict]) -> "CorpusStats":
+        """Stats over the given documents only (when no corpus-wide tables are at hand)."""
+        df: Counter = Counter()
+        totals: Counter = Counter()
+        doc_tokens = []
+        for doc in docs:
+            field_tf = doc.get("field_tf") or {}
+            tokens = {token for counts in field_tf.values() for token in counts}
+            df.update(tokens)
+            doc_tokens.append(tokens)
+            totals.update(field_lengths(field_tf))
+        return cls(
+            len(doc_tokens), lambda term: df.get(term, 0), dict(totals),
+            containing=lambda term: [token for token in df if term in token],
+            any_frequency=lambda terms: sum(1 for tokens in doc_tokens if not tokens.isdisjoint(terms)),
+        )
+
+    def tokens_containing(self, term: str) -> List[str]:
+        """Indexed tokens that contain term, the ones a substring match can hit."""
+        if self.containing is None:
+            return [term]
+        return sorted(self.containing(term))
+
+    def idf(self, term: str) -> float:
+        return self._idf(self.document_frequency(term))
+
+    def idf_any(self, tokens: List[str]) -> float:
+        """idf of "contains any of tokens"."""
+        if len(tokens) == 1:
+            return self.idf(tokens[0])
+        if self.any_frequency is not None:
+            df = self.any_frequency(tokens)
+        else:
+            df = max((self.document_frequency(token) for token in tokens), default=0)
+        return self._idf(df)
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+
+class BM25FScorer:
+    """BM25F relevance of resumes for a query's search terms.
+
+    Each term's frequency is length-normalized per field, weighted by FIELD_WEIGHTS and
+    summed before saturation, so "python" in skills outweighs a passing mention in the
+    summary, and long resumes are not favored for repeating a word. Terms under a NOT
+    are not scored (CompiledQuery.terms already leaves them out).
+
+    Terms the matcher accepts as substrings (CompiledQuery.substring_terms) are scored
+    on every vocabulary token containing them, as one term: per field the most frequent
+    of those tokens counts, so a word and the merged bigrams it appears in are not
+    counted twice.
+    """
+
+    def __init__(self, terms: Iterable[str], stats: CorpusStats, substring_terms: Iterable[str] = ()):
+        self.stats = stats
+        substring_terms = set(substring_terms)
+        groups = set()
+        for term in terms:
+            if term in substring_terms:
+                groups.add(tuple(stats.tokens_containing(term)) or (term,))
+            else:
+                groups.update((token,) for token in query_tokens(term))
+        self.groups = [(group, stats.idf_any(list(group))) for group in sorted(groups)]
+
+    def score(self, field_tf: Optional[dict], lengths: Optional[Dict[str, int]] = None) -> float:
+        field_tf = field_tf or {}
+        lengths = lengths if lengths is not None else field_lengths(field_tf)
+        total = 0.0
+        for group, idf in self.groups:
+            weighted_tf = 0.0
+            for field, counts in field_tf.items():
+                tf = max((counts.get(token, 0) for token in group), default=0)
+                if not tf:
+                    continue
+                b = FIELD_B.get(field, DEFAULT_B)
+                avg_length = self.stats.avg_field_length.get(field) or lengths.get(field) or 1
+                weighted_tf += FIELD_WEIGHTS.get(field, 1.0) * tf / (1 - b + b * lengths.get(field, 0) / avg_length)
+            if weighted_tf:
+                total += idf * weighted_tf / (K1 + weighted_tf)
+        return total
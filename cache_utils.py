@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class SQLiteCache:
+    """Persistent key/value cache stored in a local SQLite file.
+
+    Values are JSON-serialised. Entries older than `max_age_seconds` are treated
+    as misses and removed, and once the table grows past `max_entries` the least
+    recently used entries are evicted. Eviction runs on the first write and then
+    every `prune_every` written entries, so the table can exceed `max_entries` by
+    up to that many rows in between.
+    """
+
+    def __init__(self, db_path, table: str = "cache", max_entries: Optional[int] = None,
+                 max_age_seconds: Optional[float] = None, prune_every: int = 100):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.prune_every = max(1, prune_every)
+        self._pending_writes = None  # None until the first write prunes
+        self._prune_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, tag TEXT, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_tag ON {self.table} (tag)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_created ON {self.table} (created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.max_age_seconds is not None and now - created_at > self.max_age_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._is_expired(row[1], now):
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, tag: Optional[str] = None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, tag, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), tag, now, now)
+            )
+            self._maybe_evict(conn, now, 1)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Cached values for several keys in one connection; misses and expired entries are left out."""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Any] = {}
+        now = time.time()
+        with self._connect() as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                expired = [key for key, _, created_at in rows if self._is_expired(created_at, now)]
+                if expired:
+                    conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in expired])
+                hits = [(key, value) for key, value, created_at in rows if not self._is_expired(created_at, now)]
+                conn.executemany(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", [(now, key) for key, _ in hits])
+                found.update((key, json.loads(value)) for key, value in hits)
+        return found
+
+    def set_many(self, entries: Iterable[Tuple[str, Any, Optional[str]]]):
+        """Store several (key, value, tag) entries in one transaction."""
+        now = time.time()
+        rows = [(key, json.dumps(value, ensure_ascii=False), tag, now, now) for key, value, tag in entries]
+        if not rows:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, tag, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._maybe_evict(conn, now, len(rows))
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def delete_tag(self, tag: str) -> int:
+        """Drop every entry stored with the given tag."""
+        with self._connect() as conn:
+            return conn.execute(f"DELETE FROM {self.table} WHERE tag = ?", (tag,)).rowcount
+
+    def delete_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry stored with any of the given tags."""
+        with self._connect() as conn:
+            return conn.executemany(f"DELETE FROM {self.table} WHERE tag = ?", [(tag,) for tag in tags]).rowcount
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def prune(self):
+        """Apply the age and size limits now."""
+        with self._connect() as conn:
+            self._evict(conn, time.time())
+
+    def _maybe_evict(self, conn, now: float, written: int):
+        """Apply the limits only every prune_every written entries; they need a full COUNT(*)."""
+        with self._prune_lock:
+            if self._pending_writes is not None:
+                self._pending_writes += written
+                if self._pending_writes < self.prune_every:
+                    return
+            self._pending_writes = 0
+        self._evict(conn, now)
+
+    def _evict(self, conn, now: float):
+        if self.max_age_seconds is not None:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.max_age_seconds,))
+        if self.max_entries is not None:
+            count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
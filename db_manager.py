@@ -1,32 +1,219 @@
 import json
 import uuid
 from pathlib import Path
-from pymongo import MongoClient
+from typing import Dict, List
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
 import streamlit as st  # Added for secrets access
+from search_index import ResumeSearchIndex
+from vector_index import get_vector_index, semantic_top_n
+from final_retriever import derived_fields, is_search_stale, write_timestamp, DERIVED_FIELDS_PROJECTION
 
 class ResumeDBManager:
-    def __init__(self):
+    # Max identity queries per batched `$or` lookup in bulk_upsert
+    BULK_LOOKUP_CHUNK = 500
+
+    # Indexes backing the identity lookups (upserts, get/update/delete by employee_id)
+    # and the skills/technologies pre-filter in JobMatcher. Names are fixed so
+    # ensure_indexes() stays idempotent across runs.
+    INDEXES = [
+        ([("employee_id", ASCENDING)], {
+            "name": "employee_id_unique",
+            "unique": True,
+            # Resumes without an Employee ID are allowed to coexist
+            "partialFilterExpression": {"employee_id": {"$type": "string"}},
+        }),
+        ([("name", ASCENDING), ("email", ASCENDING)], {"name": "name_email"}),
+        ([("email", ASCENDING)], {"name": "email"}),
+        ([("skills", ASCENDING)], {"name": "skills"}),
+        ([("projects.technologies", ASCENDING)], {"name": "projects_technologies"}),
+        ([("skills_norm", ASCENDING)], {"name": "skills_norm"}),
+        ([("tech_norm", ASCENDING)], {"name": "tech_norm"}),
+        # Server-side Boolean search (query_compiler) and its stale-token check
+        ([("search_tokens", ASCENDING)], {"name": "search_tokens"}),
+        ([("search_version", ASCENDING)], {"name": "search_version"}),
+        # Polled by the in-memory search corpus (resume_corpus) when change streams are unavailable
+        ([("updated_at", ASCENDING)], {"name": "updated_at"}),
+    ]
+
+    # Collections already bootstrapped in this process
+    _indexed_collections = set()
+
+    # Stamped by every upload path; a re-import differing only in these is "unchanged"
+    INGEST_METADATA_FIELDS = ("timestamp", "source_file", "original_filename")
+
+    def __init__(self, ensure_indexes: bool = True):
         self.client = MongoClient(st.secrets["mongo"]["uri"])
         self.db = self.client[st.secrets["mongo"]["db_name"]]
         self.collection = self.db[st.secrets["mongo"]["collection_name"]]
+        self.search_index = ResumeSearchIndex.for_collection(
+            st.secrets["mongo"]["db_name"], st.secrets["mongo"]["collection_name"]
+        )
+        if ensure_indexes and self.collection.full_name not in ResumeDBManager._indexed_collections:
+            self.ensure_indexes()
 
-    def insert_or_update_resume(self, resume: dict):
-        """Upsert a resume based on name, email, or employee_id.
+    def ensure_indexes(self) -> List[str]:
+        """Create the collection's indexes if missing; safe to run repeatedly."""
+        created = []
+        for keys, options in self.INDEXES:
+            try:
+                created.append(self.collection.create_index(keys, **options))
+            except OperationFailure as e:
+                # e.g. duplicate employee_ids in existing data or an index with conflicting options
+                print(f"⚠️ Could not create index '{options['name']}': {e}")
+        ResumeDBManager._indexed_collections.add(self.collection.full_name)
+        return created
 
-        If a resume with the same employee_id exists, it will be updated.
-        Otherwise, fallback to name and email, or just name/email.
-        """
-        query = {}
+    @staticmethod
+    def _plan_stages(plan: dict) -> List[str]:
+        """Flatten an explain() plan tree into its stage names (with index names for IXSCANs)."""
+        if not plan:
+            return []
+        stage = plan.get("stage", "?")
+        if stage == "IXSCAN":
+            stage = f"IXSCAN({plan.get('indexName')})"
+        stages = [stage]
+        for child_key in ("inputStage", "queryPlan"):
+            if child_key in plan:
+                stages.extend(ResumeDBManager._plan_stages(plan[child_key]))
+        for child in plan.get("inputStages", []):
+            stages.extend(ResumeDBManager._plan_stages(child))
+        return stages
+
+    def index_diagnostics(self, queries: Dict[str, dict] = None) -> Dict[str, dict]:
+        """Explain the app's hot queries and report whether each one uses an index."""
+        if queries is None:
+            from job_matcher import skill_filter
+            sample = self.collection.find_one({}, {"employee_id": 1, "name": 1, "email": 1, "skills": 1}) or {}
+            skills = [skill for skill in sample.get("skills") or [] if isinstance(skill, str)] or ["python"]
+            queries = {
+                "employee_id": {"employee_id": sample.get("employee_id") or "0"},
+                "name+email": {"name": sample.get("name") or "", "email": sample.get("email") or ""},
+                "email": {"email": sample.get("email") or ""},
+                # The job matcher's pre-filter ($or over skills_norm / tech_norm)
+                "skill pre-filter": skill_filter(skills[:5]),
+            }
+
+        report = {}
+        print("🔍 Query plans:")
+        for label, query in queries.items():
+            explain = self.collection.find(query).explain()
+            stages = self._plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+            stats = explain.get("executionStats", {})
+            uses_index = any(s.startswith("IXSCAN") for s in stages)
+            report[label] = {
+                "stages": stages,
+                "uses_index": uses_index,
+                "docs_examined": stats.get("totalDocsExamined"),
+                "keys_examined": stats.get("totalKeysExamined"),
+            }
+            marker = "✅" if uses_index else "❌"
+            print(f"{marker} {label}: {' <- '.join(stages) or 'unknown plan'}")
+
+        print("\n📊 Index usage since server start:")
+        try:
+            for stat in self.collection.aggregate([{"$indexStats": {}}]):
+                print(f"- {stat['name']}: {stat.get('accesses', {}).get('ops', 0)} ops")
+        except OperationFailure as e:
+            print(f"⚠️ $indexStats not available: {e}")
+        return report
+
+    def _index_resume(self, doc: dict):
+        """Keep the on-disk search index in step with a written resume."""
+        try:
+            self.search_index.add_document(doc)
+        except Exception as e:
+            print(f"⚠️ Search index update failed for {doc.get('_id')}: {e}")
+
+    def _unindex_resume(self, doc_id):
+        try:
+            self.search_index.remove_document(doc_id)
+        except Exception as e:
+            print(f"⚠️ Search index removal failed for {doc_id}: {e}")
+        if semantic_top_n():
+            try:
+                get_vector_index(self.db.name, self.collection.name).remove([doc_id])
+            except Exception as e:
+                print(f"⚠️ Vector index removal failed for {doc_id}: {e}")
+        self._evict_scores([doc_id])
+
+    def _embed_resumes(self, docs: List[dict]):
+        """Embed written resumes for semantic retrieval (only when it is enabled)."""
+        if not docs or not semantic_top_n():
+            return
+        try:
+            get_vector_index(self.db.name, self.collection.name).upsert(docs)
+        except Exception as e:
+            # The job matcher's sync() picks them up later
+            print(f"⚠️ Embedding {len(docs)} resumes failed: {e}")
+
+    @staticmethod
+    def _evict_scores(doc_ids: List):
+        """Forget cached job-match scores of modified or deleted resumes."""
+        if not doc_ids:
+            return
+        from job_matcher import CandidateScorer
+        CandidateScorer.evict_cached_scores(doc_ids)
+
+    def refresh_resumes(self, query: dict):
+        """Recompute derived fields and re-index resumes matching a query after they were edited."""
+        for doc in self.collection.find(query):
+            derived = derived_fields(doc)
+            # Always stamped: the edit itself did not set updated_at
+            derived["updated_at"] = write_timestamp()
+            self.collection.update_one({"_id": doc["_id"]}, {"$set": derived})
+            self._index_resume({**doc, **derived})
+            self._embed_resumes([{**doc, **derived}])
+            self._evict_scores([doc["_id"]])
+
+    def backfill_derived_fields(self, batch_size: int = 500) -> int:
+        """Write the derived fields (skills_norm, tech_norm, search_tokens) wherever they are missing or stale."""
+        operations, updated = [], 0
+        for doc in self.collection.find({}):
+            derived = derived_fields(doc)
+            if any(doc.get(k) != v for k, v in derived.items()):
+                derived["updated_at"] = write_timestamp()
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": derived}))
+            if len(operations) >= batch_size:
+                updated += self.collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            updated += self.collection.bulk_write(operations, ordered=False).modified_count
+        print(f"✅ Backfilled derived search fields on {updated} resumes.")
+        return updated
 
+    @staticmethod
+    def identity_query(resume: dict) -> dict:
+        """Identity used for upserts: employee_id, else name+email, else name, else email."""
         # Prefer employee_id for upsert if present
         if resume.get("employee_id"):
-            query = {"employee_id": resume.get("employee_id")}
+            return {"employee_id": resume.get("employee_id")}
         elif resume.get("name") and resume.get("email"):
-            query = {"name": resume.get("name"), "email": resume.get("email")}
+            return {"name": resume.get("name"), "email": resume.get("email")}
         elif resume.get("name"):
-            query = {"name": resume.get("name")}
+            return {"name": resume.get("name")}
         elif resume.get("email"):
-            query = {"email": resume.get("email")}
+            return {"email": resume.get("email")}
+        return {}
+
+    @classmethod
+    def is_unchanged(cls, existing_doc: dict, fields: dict, derived: dict) -> bool:
+        """True when an upsert would not change the stored resume.
+
+        Derived values depend on stored field order, so compare the resume content
+        (ignoring ingest metadata) and only require the stored derived fields to be
+        present and current.
+        """
+        return (all(existing_doc.get(k) == v for k, v in fields.items() if k not in cls.INGEST_METADATA_FIELDS)
+                and all(k in existing_doc for k in derived) and not is_search_stale(existing_doc))
+
+    def insert_or_update_resume(self, resume: dict):
+        """Upsert a resume based on name, email, or employee_id.
+
+        If a resume with the same employee_id exists, it will be updated.
+        Otherwise, fallback to name and email, or just name/email.
+        """
+        query = self.identity_query(resume)
 
         # If we have a valid query, try to find existing document
         if query:
@@ -36,9 +223,17 @@ class ResumeDBManager:
                 # Document exists - update it
                 # Remove _id from resume data to avoid conflicts
                 resume_update = {k: v for k, v in resume.items() if k != "_id"}
-                result = self.collection.update_one(query, {"$set": resume_update})
+                derived = derived_fields({**existing_doc, **resume_update})
+                derived["updated_at"] = write_timestamp()
+                # Same "unchanged" rule as bulk_upsert, so updated_at only moves on real changes
+                unchanged = self.is_unchanged(existing_doc, resume_update, derived)
+                resume_update.update(derived)
+                modified = not unchanged and self.collection.update_one(query, {"$set": resume_update}).modified_count > 0
                 
-                if result.modified_count > 0:
+                if modified:
+                    self._index_resume({**existing_doc, **resume_update})
+                    self._embed_resumes([{**existing_doc, **resume_update}])
+                    self._evict_scores([existing_doc["_id"]])
                     print(
                         f"✅ Updated existing resume for {resume.get('name', 'Unknown')} "
                         f"({resume.get('email', 'No email')}) | Employee ID: {resume.get('employee_id', 'N/A')}"
@@ -51,9 +246,13 @@ class ResumeDBManager:
                 return existing_doc["_id"]
             else:
                 # Document doesn't exist - insert new one
+                resume.update(derived_fields(resume))
+                resume["updated_at"] = write_timestamp()
                 if "_id" not in resume:
                     resume["_id"] = str(uuid.uuid4())
                 result = self.collection.insert_one(resume)
+                self._index_resume(resume)
+                self._embed_resumes([resume])
                 print(
                     f"✅ Inserted new resume for {resume.get('name', 'Unknown')} "
                     f"({resume.get('email', 'No email')}) | Employee ID: {resume.get('employee_id', 'N/A')}"
@@ -61,39 +260,138 @@ class ResumeDBManager:
                 return result.inserted_id
         else:
             # If we don't have a valid query, just insert with a new ID
+            resume.update(derived_fields(resume))
+            resume["updated_at"] = write_timestamp()
             if "_id" not in resume:
                 resume["_id"] = str(uuid.uuid4())
             result = self.collection.insert_one(resume)
+            self._index_resume(resume)
+            self._embed_resumes([resume])
             print(
                 f"✅ Inserted document with new ID: {result.inserted_id} | Employee ID: {resume.get('employee_id', 'N/A')}"
             )
             return result.inserted_id
         
+    def _find_existing(self, queries: List[dict]) -> Dict[tuple, dict]:
+        """Resolve many identity queries with batched `$or` lookups, keyed by query."""
+        existing = {}
+        unique_queries = list({tuple(sorted(q.items())): q for q in queries if q}.values())
+        for start in range(0, len(unique_queries), self.BULK_LOOKUP_CHUNK):
+            chunk = unique_queries[start:start + self.BULK_LOOKUP_CHUNK]
+            for doc in self.collection.find({"$or": chunk}):
+                # Attribute the document to every query it satisfies; first match wins like find_one
+                for q in chunk:
+                    key = tuple(sorted(q.items()))
+                    if key not in existing and all(doc.get(k) == v for k, v in q.items()):
+                        existing[key] = doc
+        return existing
+
+    def bulk_upsert(self, resumes: List[dict], ordered: bool = False) -> List[dict]:
+        """Upsert many resumes with one batched lookup and a single bulk_write.
+
+        Uses the same identity precedence as insert_or_update_resume. Returns one
+        entry per input resume: {"_id", "name", "outcome"} where outcome is
+        "inserted", "updated", "unchanged" or "failed" (with an "error").
+        """
+        queries = [self.identity_query(resume) for resume in resumes]
+        existing = self._find_existing(queries)
+
+        # Resumes sharing an identity collapse into one write (later files win, like sequential upserts)
+        groups: Dict[tuple, dict] = {}
+        for i, (resume, query) in enumerate(zip(resumes, queries)):
+            key = tuple(sorted(query.items())) if query else ("__new__", i)
+            group = groups.setdefault(key, {"query": query, "fields": {}, "members": [], "_id": resume.get("_id")})
+            group["fields"].update({k: v for k, v in resume.items() if k != "_id"})
+            group["members"].append(i)
+
+        outcomes: List[dict] = [None] * len(resumes)
+        operations, op_groups = [], []
+        now = write_timestamp()
+        for key, group in groups.items():
+            existing_doc = existing.get(key)
+            derived = derived_fields({**(existing_doc or {}), **group["fields"]})
+            derived["updated_at"] = now
+            if existing_doc is not None:
+                group["_id"] = existing_doc["_id"]
+                if self.is_unchanged(existing_doc, group["fields"], derived):
+                    group["doc"] = existing_doc
+                    group["outcome"] = "unchanged"
+                    continue
+                group["fields"].update(derived)
+                group["doc"] = {**existing_doc, **group["fields"]}
+                group["outcome"] = "updated"
+                update = {"$set": group["fields"]}
+            else:
+                group["fields"].update(derived)
+                group["_id"] = group["_id"] or str(uuid.uuid4())
+                group["doc"] = {**group["fields"], "_id": group["_id"]}
+                group["outcome"] = "inserted"
+                update = {"$set": group["fields"], "$setOnInsert": {"_id": group["_id"]}}
+            query = group["query"] or {"_id": group["_id"]}
+            operations.append(UpdateOne(query, update, upsert=True))
+            op_groups.append(group)
+
+        failed_ops = {}
+        if operations:
+            try:
+                self.collection.bulk_write(operations, ordered=ordered)
+            except BulkWriteError as e:
+                failed_ops = {err["index"]: err.get("errmsg", "write error") for err in e.details.get("writeErrors", [])}
+                if ordered:
+                    # An ordered bulk stops at the first error; nothing after it was applied
+                    first = min(failed_ops) if failed_ops else len(operations)
+                    for index in range(first + 1, len(operations)):
+                        failed_ops.setdefault(index, "not applied (ordered bulk aborted)")
+
+        for index, group in enumerate(op_groups):
+            if index in failed_ops:
+                group["outcome"] = "failed"
+                group["error"] = failed_ops[index]
+            else:
+                self._index_resume(group["doc"])
+        self._embed_resumes([group["doc"] for index, group in enumerate(op_groups) if index not in failed_ops])
+        self._evict_scores([group["_id"] for index, group in enumerate(op_groups)
+                            if index not in failed_ops and group["outcome"] == "updated"])
+
+        for group in groups.values():
+            for i in group["members"]:
+                outcome = {"_id": group["_id"], "name": resumes[i].get("name", "Unknown"), "outcome": group["outcome"]}
+                if group.get("error"):
+                    outcome["error"] = group["error"]
+                outcomes[i] = outcome
+
+        counts = {name: sum(1 for o in outcomes if o["outcome"] == name)
+                  for name in ("inserted", "updated", "unchanged", "failed")}
+        print(
+            f"✅ Bulk upsert: {counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['failed']} failed ({len(operations)} writes)"
+        )
+        return outcomes
+
     def bulk_insert(self, folder_path: str):
-        """Upsert all JSON files in a folder using insert_or_update_resume logic."""
+        """Upsert all JSON files in a folder with a single bulk_upsert."""
         folder = Path(folder_path)
         files = list(folder.glob("*.json"))
         print(f"📂 Found {len(files)} resumes to insert or update.\n")
 
-        inserted, failed = 0, 0
-
+        docs, failed = [], 0
         for file in files:
             try:
                 with open(file, "r", encoding="utf-8") as f:
-                    doc = json.load(f)
-                # Use the same logic as the single resume insertion
-                self.insert_or_update_resume(doc)
-                inserted += 1
+                    docs.append(json.load(f))
             except Exception as e:
-                print(f"❌ Failed to upsert {file.name}: {e}")
+                print(f"❌ Failed to read {file.name}: {e}")
                 failed += 1
 
-        print(f"\n📊 Summary: Total = {len(files)}, Upserted = {inserted}, Failed = {failed}")
+        outcomes = self.bulk_upsert(docs) if docs else []
+        failed += sum(1 for o in outcomes if o["outcome"] == "failed")
+        print(f"\n📊 Summary: Total = {len(files)}, Upserted = {len(files) - failed}, Failed = {failed}")
+        return outcomes
 
     def find(self, query: dict):
         """Find resumes matching a query."""
         print(f"🔍 Finding resumes matching: {query}")
-        results = list(self.collection.find(query))
+        results = list(self.collection.find(query, DERIVED_FIELDS_PROJECTION))
         print(f"🔎 Found {len(results)} resumes.\n")
         for res in results:
             print(f"- {res.get('name')} | {res.get('email')} | ID: {res.get('_id')}")
@@ -105,8 +403,11 @@ class ResumeDBManager:
         if not employee_id:
             print("❌ Update failed: 'employee_id' field is required.")
             return None
-        result = self.collection.update_one({"employee_id": employee_id}, {"$set": update_data})
+        result = self.collection.update_one(
+            {"employee_id": employee_id}, {"$set": {**update_data, "updated_at": write_timestamp()}}
+        )
         if result.modified_count:
+            self.refresh_resumes({"employee_id": employee_id})
             print(f"✅ Updated resume with Employee ID {employee_id}")
         else:
             print(f"⚠️ No resume found or no change for Employee ID {employee_id}")
@@ -118,8 +419,10 @@ class ResumeDBManager:
             print("❌ Delete failed: 'employee_id' field is required.")
             return None
 
+        existing_doc = self.collection.find_one({"employee_id": employee_id}, {"_id": 1})
         result = self.collection.delete_one({"employee_id": employee_id})
         if result.deleted_count:
+            self._unindex_resume(existing_doc["_id"])
             print(f"🗑️ Deleted resume with Employee ID {employee_id}")
         else:
             print(f"⚠️ No resume found with Employee ID {employee_id}")
@@ -128,6 +431,13 @@ class ResumeDBManager:
     def delete_all_resumes(self):
         """Delete all resumes in the collection."""
         result = self.collection.delete_many({})
+        self.search_index.clear()
+        if semantic_top_n():
+            get_vector_index(self.db.name, self.collection.name).clear()
+        from job_matcher import CandidateScorer
+        cache = CandidateScorer.score_cache()
+        if cache is not None:
+            cache.clear()
         print(f"🗑️ Deleted {result.deleted_count} resumes.")
         return result
 
@@ -141,9 +451,13 @@ if __name__ == "__main__":
     parser.add_argument("--update", help="JSON string with _id and fields to update")
     parser.add_argument("--delete", help="JSON string with _id of resume to delete")
     parser.add_argument("--delete-all", action="store_true", help="Delete all resumes in the collection")
+    parser.add_argument("--rebuild-index", action="store_true", help="Rebuild the on-disk Boolean search index")
+    parser.add_argument("--backfill-norm", action="store_true", help="Write skills_norm/tech_norm/search_tokens on existing resumes")
+    parser.add_argument("--ensure-indexes", action="store_true", help="Create the MongoDB indexes if missing")
+    parser.add_argument("--index-diagnostics", action="store_true", help="Explain the hot queries and report index usage")
 
     args = parser.parse_args()
-    db = ResumeDBManager()
+    db = ResumeDBManager(ensure_indexes=not args.ensure_indexes)
 
     if args.file:
         with open(args.file, "r", encoding="utf-8") as f:
@@ -176,5 +490,19 @@ if __name__ == "__main__":
     elif args.delete_all:
         db.delete_all_resumes()
 
+    elif args.rebuild_index:
+        db.search_index.rebuild(db.collection.find({}, DERIVED_FIELDS_PROJECTION))
+
+    elif args.backfill_norm:
+        db.backfill_derived_fields()
+
+    elif args.ensure_indexes:
+        for name in db.ensure_indexes():
+            print(f"✅ Index ready: {name}")
+
+    elif args.index_diagnostics:
+        db.index_diagnostics()
+
     else:
-        print("⚠️ Please provide one of --file, --folder, --find, --update, or --delete.")
\ No newline at end of file
+        print("⚠️ Please provide one of --file, --folder, --find, --update, --delete, --rebuild-index, "
+              "--backfill-norm, --ensure-indexes, or --index-diagnostics.")
\ No newline at end of file
@@ -1,10 +1,19 @@
+import hashlib
+import heapq
 import json
+import math
 import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
 import streamlit as st
-from pymongo import MongoClient
-from boolean.boolean import BooleanAlgebra, Symbol, AND, OR
+from pymongo import MongoClient, UpdateOne
+from boolean.boolean import BooleanAlgebra, Symbol, AND, OR, NOT
 import config
 import openai
+from highlight_utils import get_highlighter
+from cache_utils import SQLiteCache
 
 AZURE_OPENAI_API_KEY = st.secrets["azure_openai"]["api_key"]
 AZURE_OPENAI_ENDPOINT = st.secrets["azure_openai"]["endpoint"]
@@ -42,6 +51,78 @@ def convert_natural_language_to_boolean(nl_query):
     )
     return response.choices[0].message.content.strip()
 
+# Bump when the conversion prompt above changes
+NL_PROMPT_VERSION = "1"
+NL_CACHE_PATH = Path("data2/cache/nl_boolean_cache.sqlite3")
+NL_CACHE_MAX_ENTRIES = 5000
+NL_CACHE_MAX_AGE_DAYS = 30
+# Words that mark a natural-language request rather than a Boolean query
+NL_STOPWORDS = {
+    "a", "an", "the", "me", "i", "we", "who", "someone", "anyone", "candidates", "candidate", "profiles",
+    "find", "show", "want", "need", "looking", "with", "without", "knows", "know", "skilled", "experience",
+    "experienced", "in", "of", "for", "either", "but", "has", "have", "having", "please", "any", "some",
+}
+_nl_cache = None
+
+def get_nl_cache():
+    global _nl_cache
+    if _nl_cache is None:
+        _nl_cache = SQLiteCache(
+            NL_CACHE_PATH,
+            table="nl_boolean",
+            max_entries=NL_CACHE_MAX_ENTRIES,
+            max_age_seconds=NL_CACHE_MAX_AGE_DAYS * 24 * 3600
+        )
+    return _nl_cache
+
+def looks_like_boolean(query: str) -> bool:
+    """True if the query is already Boolean (or a single term) and needs no LLM conversion."""
+    text = re.sub(r"\"[^\"]*\"|'[^']*'", " QUOTED_PHRASE ", query)
+    tokens = re.findall(r"\(|\)|\w+", text)
+    words = [t for t in tokens if t not in ("(", ")") and t.lower() not in ("and", "or", "not")]
+    if not words or any(w.lower() in NL_STOPWORDS for w in words):
+        return False
+    has_operator = len(words) < len(tokens) or "QUOTED_PHRASE" in words
+    if len(words) > 1 and not has_operator:
+        return False
+    # A long run of bare words (implicit ANDs) reads like a sentence
+    run = 0
+    for tok in tokens:
+        run = run + 1 if tok in words else 0
+        if run > 3:
+            return False
+    try:
+        BooleanSearchParser().parse_query(normalize_boolean_operators(query))
+    except Exception:
+        return False
+    return True
+
+def convert_query_to_boolean(query: str) -> str:
+    """Boolean form of a search box entry: as typed if already Boolean, else the memoized LLM conversion."""
+    if looks_like_boolean(query):
+        return query
+    normalized = " ".join(query.split()).casefold()
+    key = hashlib.sha256(json.dumps({
+        "query": normalized,
+        "prompt_version": NL_PROMPT_VERSION,
+        "deployment": AZURE_OPENAI_DEPLOYMENT,
+    }).encode("utf-8")).hexdigest()
+    try:
+        cache = get_nl_cache()
+        cached = cache.get(key)
+    except Exception as e:
+        print(f"⚠️ NL query cache unavailable: {e}")
+        cache, cached = None, None
+    if cached is not None:
+        return cached
+    converted = convert_natural_language_to_boolean(query)
+    if cache is not None and converted:
+        try:
+            cache.set(key, converted, tag=NL_PROMPT_VERSION)
+        except Exception as e:
+            print(f"⚠️ NL query cache write failed: {e}")
+    return converted
+
 
 
 
@@ -88,6 +169,8 @@ class BooleanSearchParser:
                 if tok.lower() not in ops and tok not in ['(', ')'] and \
                    nxt.lower() not in ops and nxt not in ['(', ')']:
                     result.append('and')  # Use lowercase 'and' for implicit AND
+                elif (tok.lower() not in ops and tok != '(') and nxt.lower() == 'not':
+                    result.append('and')  # "java NOT android" means java AND NOT android
 
         return ' '.join(result)
 
@@ -109,8 +192,8 @@ class BooleanSearchParser:
 
 
 
-def normalize(text: str) -> str:
-    """Lowercase, split CamelCase, remove noise, then inject merged bigrams & halves."""
+def tokenize(text: str, bigrams: bool = True) -> list:
+    """normalize() tokens with repeats kept, for term-frequency counts."""
     # 1) Split CamelCase: "HuggingFace" → "Hugging Face"
     text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
 
@@ -129,30 +212,106 @@ def normalize(text: str) -> str:
     text = text.replace('"', '')
     text = re.sub(r'[^\w\s]', ' ', text)
 
-    # 5) Tokenize & inject bigrams + halves
-    words = text.split()
-    # 5a) adjacent-word bigrams
-    for i in range(len(words) - 1):
-        text += " " + words[i] + words[i+1]
-    # 5b) for long merged tokens, also inject a halved split
-    for tok in words:
-        if len(tok) > 8:
-            mid = len(tok) // 2
-            text += f" {tok[:mid]} {tok[mid:]}"
-
-    # 6) Normalize whitespace and ensure single spaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # 7) Remove duplicate words
+    # 5) Tokenize & inject merged bigrams ("machine learning" -> "machinelearning");
+    # other spelling variants are handled by query-time expansion (term_expansion.py)
     words = text.split()
-    unique_words = []
-    seen_words = set()
-    for word in words:
-        if word not in seen_words:
-            seen_words.add(word)
-            unique_words.append(word)
-    
-    return ' '.join(unique_words)
+    if not bigrams:
+        return words
+    return words + [words[i] + words[i+1] for i in range(len(words) - 1)]
+
+def normalize(text: str) -> str:
+    """Lowercase, split CamelCase, remove noise, then inject merged bigrams (each token once)."""
+    return ' '.join(dict.fromkeys(tokenize(text)))
+
+# Bump whenever normalize() or the derived search fields change so they get recomputed
+NORMALIZE_VERSION = "3"
+
+# Derived fields written at ingestion for indexed skill lookups and search, plus the
+# write timestamp the in-memory corpus polls on. They are not part of the resume
+# itself, so reads exclude them with DERIVED_FIELDS_PROJECTION.
+DERIVED_FIELDS = ("skills_norm", "tech_norm", "search_tokens", "field_tf", "search_version", "updated_at")
+DERIVED_FIELDS_PROJECTION = {field: 0 for field in DERIVED_FIELDS}
+SEARCH_FIELDS_PROJECTION = {"search_tokens": 1, "field_tf": 1, "search_version": 1, "name": 1}
+
+def canonical_phrase(text: str) -> str:
+    """Collapse a phrase into the single merged token normalize() produces ("Machine Learning" -> "machinelearning")."""
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text).lower()
+    text = re.sub(r'(?<![\w@])\.net(?![\w.])', ' dotnet ', text)
+    return re.sub(r'[^a-z0-9]', '', text)
+
+def canonical_terms(values) -> list:
+    """Lookup terms for skill/technology strings: the raw lowercased value, its normalize() tokens and merged phrase."""
+    terms = set()
+    for value in values or []:
+        if not isinstance(value, str) or not value.strip():
+            continue
+        terms.add(value.strip().lower())
+        terms.update(normalize(value).split())
+        merged = canonical_phrase(value)
+        if merged:
+            terms.add(merged)
+    return sorted(terms)
+
+def derived_fields(resume: dict) -> dict:
+    """Compute the skills_norm / tech_norm arrays, search tokens and per-field term counts for a resume."""
+    from bm25 import field_term_counts
+    skills = resume.get("skills")
+    if isinstance(skills, str):
+        skills = [skills]
+    technologies, description_terms = [], set()
+    for project in resume.get("projects") or []:
+        if isinstance(project, dict):
+            techs = project.get("technologies") or []
+            technologies.extend([techs] if isinstance(techs, str) else techs)
+            # Standardized projects usually carry the stack only in their description
+            if isinstance(project.get("description"), str):
+                description_terms.update(normalize(project["description"]).split())
+    return {
+        "skills_norm": canonical_terms(skills if isinstance(skills, list) else []),
+        "tech_norm": sorted(description_terms.union(canonical_terms(technologies))),
+        "search_tokens": compute_search_tokens(resume),
+        "field_tf": field_term_counts(resume),
+        "search_version": NORMALIZE_VERSION,
+    }
+
+def strip_derived_fields(resume: dict) -> dict:
+    return {k: v for k, v in resume.items() if k not in DERIVED_FIELDS}
+
+def compute_search_tokens(resume: dict) -> list:
+    """The normalized token stream the Boolean search runs on (ids and derived fields excluded)."""
+    content = {k: v for k, v in resume.items() if k not in DERIVED_FIELDS and k != "_id"}
+    return normalize(flatten_json(content)).split()
+
+def is_search_stale(doc: dict) -> bool:
+    return (doc.get("search_version") != NORMALIZE_VERSION or not isinstance(doc.get("search_tokens"), list)
+            or not isinstance(doc.get("field_tf"), dict))
+
+def write_timestamp() -> datetime:
+    """Value for `updated_at`; every write to a resume sets it so readers can poll for changes."""
+    return datetime.now(timezone.utc)
+
+def repair_stale_search_fields(coll, docs: list) -> int:
+    """Re-normalize resumes written before the current normalize() version, store the
+    result and update the given (projected) docs in place. Returns how many were stale."""
+    stale_ids = [doc["_id"] for doc in docs if is_search_stale(doc)]
+    if not stale_ids:
+        return 0
+    refreshed = {}
+    repairs = []
+    for full_doc in coll.find({"_id": {"$in": stale_ids}}):
+        derived = derived_fields(full_doc)
+        derived["updated_at"] = write_timestamp()
+        refreshed[full_doc["_id"]] = derived
+        repairs.append(UpdateOne({"_id": full_doc["_id"]}, {"$set": derived}))
+    try:
+        if repairs:
+            coll.bulk_write(repairs, ordered=False)
+    except Exception as e:
+        st.warning(f"⚠️ Could not store refreshed search tokens: {e}")
+    for doc in docs:
+        if doc["_id"] in refreshed:
+            doc.update(refreshed[doc["_id"]])
+    return len(stale_ids)
 
 # Flattener
 def flatten_json(obj) -> str:
@@ -171,91 +330,128 @@ def flatten_json(obj) -> str:
 
 # Evaluator
 
-def calculate_rank(doc, matched_terms, norm_text):
-    """Calculate a relevance score based on number of highlights."""
-    # Count total number of matches for all terms
-    total_matches = 0
-    for term in matched_terms:
-        # Count all matches (both exact and substring)
-        pattern = r'\b' + re.escape(term) + r'\b'
-        matches = len(re.findall(pattern, norm_text, re.IGNORECASE))
-        total_matches += matches
-        
-        # Also count substring matches to catch all instances
-        substring_matches = norm_text.count(term.lower())
-        total_matches += substring_matches
-    
-    return total_matches
+@lru_cache(maxsize=2048)
+def term_pattern(term: str, flags: int = 0):
+    """Compiled whole-word pattern for a term, shared across queries and documents."""
+    return re.compile(r'\b' + re.escape(term) + r'\b', flags)
+
+def quoted_phrase_for(term: str, quoted_phrases: dict):
+    """Phrase behind a QUOTED_PHRASE_n placeholder (matched case-insensitively), else None."""
+    for placeholder, phrase in (quoted_phrases or {}).items():
+        if placeholder.lower() == term.lower():
+            return phrase.lower()
+    return None
+
+class TermAlternatives(OR):
+    """A query term OR-ed with its aliases / spelling variants (see term_expansion.py).
+
+    Evaluators treat it like the term itself, so as an AND operand every
+    alternative needs a whole-word match.
+    """
+
+TERM_NODES = (Symbol, TermAlternatives)
+
+class CompiledQuery:
+    """A Boolean expression compiled once into per-term matchers, then applied to each document.
+
+    Quoted phrases are substring matches, AND operands and terms of 4 or fewer
+    characters need a whole-word match, and longer terms also accept a substring.
+    Documents are normalize() output (\\w+ tokens joined by single spaces), so a
+    whole-word match of a \\w+ term is a lookup in the document's token set, and so
+    is a substring match when `containing` (term -> vocabulary tokens containing it)
+    is given. NOT inverts its operand, matched with the same rules as anywhere else.
+    """
+
+    def __init__(self, expr, quoted_phrases=None, containing=None):
+        self.quoted_phrases = quoted_phrases or {}
+        self.containing = containing
+        self.terms = extract_search_terms(expr, self.quoted_phrases)
+        # \w+ terms matched as substrings of tokens (outside NOT), for BM25F to expand
+        self.substring_terms = set()
+        self._needs_tokens = False
+        # Whether any part reads the joined text; False lets callers skip building it
+        self.needs_text = False
+        self._negation_depth = 0
+        self._match = self._compile(expr)
+
+    def _compile_symbol(self, symbol, word_boundary_only: bool):
+        term = str(symbol.obj).lower()
+        phrase = quoted_phrase_for(term, self.quoted_phrases)
+        if phrase is not None:
+            self.needs_text = True
+            return lambda text, tokens: phrase in text()
+        if word_boundary_only or len(term) <= 4:
+            if re.fullmatch(r'\w+', term):
+                self._needs_tokens = True
+                return lambda text, tokens: term in tokens
+            self.needs_text = True
+            search = term_pattern(term).search
+            return lambda text, tokens: search(text()) is not None
+        if re.fullmatch(r'\w+', term):
+            if not self._negation_depth:
+                self.substring_terms.add(term)
+            if self.containing is not None:
+                # Tokens never contain spaces, so a substring of the text is a substring of a token
+                self._needs_tokens = True
+                hits = frozenset(self.containing(term))
+                return lambda text, tokens: not hits.isdisjoint(tokens)
+        self.needs_text = True
+        # A whole-word hit is also a substring hit, so the substring test alone decides
+        return lambda text, tokens: term in text()
+
+    def _compile(self, expr, word_boundary_only: bool = False):
+        if isinstance(expr, Symbol):
+            return self._compile_symbol(expr, word_boundary_only)
+        if isinstance(expr, AND):
+            parts = [self._compile(arg, word_boundary_only=isinstance(arg, TERM_NODES)) for arg in expr.args]
+            return lambda text, tokens: all(part(text, tokens) for part in parts)
+        if isinstance(expr, OR):
+            # word_boundary_only is only ever set for TermAlternatives
+            parts = [self._compile(arg, word_boundary_only) for arg in expr.args]
+            return lambda text, tokens: any(part(text, tokens) for part in parts)
+        if isinstance(expr, NOT):
+            self._negation_depth += 1
+            part = self._compile(expr.args[0])
+            self._negation_depth -= 1
+            return lambda text, tokens: not part(text, tokens)
+        return lambda text, tokens: False
+
+    def matches(self, text, tokens=None) -> bool:
+        """Evaluate against normalized text, or a function returning it that is called
+        at most once and only if a phrase or substring needs it; pass its tokens if they
+        are already at hand."""
+        if isinstance(text, str):
+            get_text = lambda: text
+        else:
+            built = []
 
-def evaluate_expression(expr, text, quoted_phrases=None):
-    """Recursively evaluate Boolean expression against text, with substring fallback."""
-    quoted_phrases = quoted_phrases or {}
-    
-    if isinstance(expr, Symbol):
-        term = str(expr.obj).lower()
-        
-        # 1) exact‐phrase placeholders
-        if term.startswith("QUOTED_PHRASE_") and term in quoted_phrases:
-            phrase = quoted_phrases[term].lower()
-            return phrase in text
-        
-        # 2) Special handling for short terms (4 or fewer characters)
-        if len(term) <= 4:
-            # For short terms, require exact word boundary match
-            pattern = r'\b' + re.escape(term) + r'\b'
-            return bool(re.search(pattern, text))
-        
-        # 3) For longer terms, use word boundary match
-        pattern = r'\b' + re.escape(term) + r'\b'
-        if re.search(pattern, text):
-            return True
-        
-        # 4) fallback: substring (only for terms longer than 4 characters)
-        return term in text
+            def get_text():
+                if not built:
+                    built.append(text())
+                return built[0]
+        if self._needs_tokens and not isinstance(tokens, (set, frozenset)):
+            tokens = set(get_text().split() if tokens is None else tokens)
+        return self._match(get_text, tokens)
 
-    elif isinstance(expr, AND):
-        # For AND operations, ensure all terms are found in different positions
-        found_positions = set()
-        for arg in expr.args:
-            if isinstance(arg, Symbol):
-                term = str(arg.obj).lower()
-                if term.startswith("QUOTED_PHRASE_") and term in quoted_phrases:
-                    phrase = quoted_phrases[term].lower()
-                    pos = text.find(phrase)
-                    if pos == -1:
-                        return False
-                    found_positions.add(pos)
-                else:
-                    pattern = r'\b' + re.escape(term) + r'\b'
-                    match = re.search(pattern, text)
-                    if not match:
-                        return False
-                    found_positions.add(match.start())
-            else:
-                if not evaluate_expression(arg, text, quoted_phrases):
-                    return False
-        return True
+def evaluate_expression(expr, text, quoted_phrases=None):
+    """Evaluate a Boolean expression against text, with substring fallback.
 
-    elif isinstance(expr, OR):
-        # For OR operations, check if any term matches
-        for arg in expr.args:
-            if evaluate_expression(arg, text, quoted_phrases):
-                return True
-        return False
-    
-    return False
+    Compiles the query on every call; use CompiledQuery to match many documents.
+    """
+    return CompiledQuery(expr, quoted_phrases).matches(text)
 
 def extract_search_terms(expr, quoted_phrases=None):
-    """Extract all search terms from the boolean expression for highlighting."""
+    """Extract all search terms from the boolean expression for highlighting.
+
+    Terms under a NOT are skipped: a matching resume never contains them.
+    """
     quoted_phrases = quoted_phrases or {}
     terms = set()
     
     if isinstance(expr, Symbol):
         term = str(expr.obj).lower()
-        if term.startswith("QUOTED_PHRASE_") and term in quoted_phrases:
-            terms.add(quoted_phrases[term].lower())
-        else:
-            terms.add(term)
+        phrase = quoted_phrase_for(term, quoted_phrases)
+        terms.add(phrase if phrase is not None else term)
     elif isinstance(expr, (AND, OR)):
         for arg in expr.args:
             terms.update(extract_search_terms(arg, quoted_phrases))
@@ -267,30 +463,10 @@ def highlight_text(text: str, matched_terms: set) -> str:
     if not matched_terms or not text:
         return text
     
-    # Sort terms by length (longest first) to avoid partial matches
-    sorted_terms = sorted(matched_terms, key=len, reverse=True)
-    
-    # Create a copy of the text to modify
-    highlighted_text = text
-    
-    # Replace each term with its highlighted version
-    for term in sorted_terms:
-        # Escape special characters in the term for regex
-        escaped_term = re.escape(term)
-        # Use word boundaries to match whole words only, case-insensitive
-        pattern = r'\b' + escaped_term + r'\b'
-        
-        # Find all matches with their original case
-        matches = list(re.finditer(pattern, highlighted_text, flags=re.IGNORECASE))
-        
-        # Process matches in reverse order to maintain correct positions
-        for match in reversed(matches):
-            original_text = match.group(0)  # Get the matched text with original case
-            highlighted_text = highlighted_text[:match.start()] + \
-                             f'<span style="background-color: #ffeb3b; font-weight: bold;">{original_text}</span>' + \
-                             highlighted_text[match.end():]
-    
-    return highlighted_text
+    # One pass over the text; overlapping terms resolve to the longest match
+    return get_highlighter(matched_terms).wrap(
+        text, '<span style="background-color: #ffeb3b; font-weight: bold;">', '</span>'
+    )
 
 def highlight_dict_values(d: dict, matched_terms: set) -> dict:
     """Recursively highlight text in dictionary values."""
@@ -308,6 +484,41 @@ def highlight_dict_values(d: dict, matched_terms: set) -> dict:
             result[key] = value
     return result
 
+# Highlighted detail views kept per session, keyed by (doc_id, query)
+HIGHLIGHT_CACHE_SIZE = 64
+# Per-result session_state keys that belong to the current query only
+RESULT_STATE_PREFIXES = ("show_details_", "highlighted_doc_", "matched_terms_", "search_page")
+# Result cards rendered per page
+RESULTS_PAGE_SIZE = 20
+
+def reset_result_state(query_key):
+    """Drop per-result session state and cached highlights when the search query changes."""
+    if st.session_state.get("active_search_query") == query_key:
+        return
+    for key in list(st.session_state.keys()):
+        if str(key).startswith(RESULT_STATE_PREFIXES):
+            del st.session_state[key]
+    cache = st.session_state.get("highlight_cache")
+    if cache:
+        for cache_key in [k for k in cache if k[1] != query_key]:
+            del cache[cache_key]
+    st.session_state.active_search_query = query_key
+
+def get_highlighted_doc(doc: dict, search_terms: set, query_key) -> dict:
+    """Highlight a resume on demand, memoized in a bounded per-session LRU."""
+    if "highlight_cache" not in st.session_state:
+        st.session_state.highlight_cache = OrderedDict()
+    cache = st.session_state.highlight_cache
+    key = (str(doc.get("_id")), query_key)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    highlighted = highlight_dict_values(doc, search_terms)
+    cache[key] = highlighted
+    while len(cache) > HIGHLIGHT_CACHE_SIZE:
+        cache.popitem(last=False)
+    return highlighted
+
 def display_json(data):
     if "_id" in data:
         del data["_id"]
@@ -413,6 +624,24 @@ def render_formatted_resume(resume: dict):
             st.markdown(resume['social_profiles'], unsafe_allow_html=True)
 
 # Main Streamlit App
+def load_candidates_from_database(coll, index, parsed_query, quoted_phrases) -> list:
+    """Resumes (search fields only) that may match: MongoDB filters on search_tokens when
+    every resume has current tokens, else the local inverted index picks the ids."""
+    from search_index import mongo_ids
+    from query_compiler import compile_mongo_filter
+    compiled = compile_mongo_filter(parsed_query, quoted_phrases)
+    has_stale = coll.find_one({"search_version": {"$ne": NORMALIZE_VERSION}}, {"_id": 1}) is not None
+    if compiled is not None and not has_stale:
+        # Only the stored token stream is needed to evaluate the query
+        return list(coll.find(compiled[0], SEARCH_FIELDS_PROJECTION))
+    if not index.is_synced(coll):
+        with st.spinner("Building search index (one-time)..."):
+            index.rebuild(coll.find({}, DERIVED_FIELDS_PROJECTION))
+    candidate_ids = index.search(parsed_query, quoted_phrases)
+    if not candidate_ids:
+        return []
+    return list(coll.find({"_id": {"$in": mongo_ids(candidate_ids)}}, SEARCH_FIELDS_PROJECTION))
+
 def main():
     st.set_page_config(
         page_title="HR Bot Resume Search", 
@@ -471,12 +700,13 @@ def main():
             - **Simple keyword**: `Python`
             - **AND operator**: `Python AND Django`,'Machine Learning AND Python'.
             - **OR operator**: `JavaScript OR TypeScript`
+            - **NOT operator**: `Java AND NOT Android`, `Python NOT Django`
             - **Grouped logic**: `(Python OR Java) AND (AWS OR Azure)`
             """)
         st.divider()
         st.markdown("""
         **About**  
-        Find relevant candidates by matching keywords and phrases in their profiles. Supports Boolean search for precise filtering ad logical searching using AND/OR logics.
+        Find relevant candidates by matching keywords and phrases in their profiles. Supports Boolean search for precise filtering ad logical searching using AND/OR/NOT logics.
         """)
 
     # Main content
@@ -484,8 +714,9 @@ def main():
     st.markdown("### Search for Candidates")
     search_query = st.text_input("Enter your search query:", placeholder="e.g., Python AND Machine Learning")
     if search_query:
-            search_query = convert_natural_language_to_boolean(search_query)
+            search_query = convert_query_to_boolean(search_query)
             search_query = normalize_boolean_operators(search_query)
+    reset_result_state(search_query or None)
     if not search_query:
         st.info("👆 Enter a search query above to begin searching.")
         # Sample placeholders when no search is performed
@@ -504,6 +735,7 @@ def main():
             - `Python AND (Django OR Flask)`
             - `JavaScript AND React`
             - `AWS OR Azure`
+            - `Java AND NOT Android`
             """)
         return
 
@@ -518,16 +750,51 @@ def main():
     else:
         parsed_query = Symbol(search_query.lower())
 
-    # Connect to MongoDB
+    # Candidates come from the process-wide in-memory corpus; if it cannot be loaded,
+    # MongoDB selects them (a filter over search_tokens, or the local inverted index)
+    from search_index import ResumeSearchIndex
+    from term_expansion import expand_query
+    from resume_corpus import get_resume_corpus
+    try:
+        with st.spinner("Loading resumes..."):
+            corpus = get_resume_corpus(config.MONGO_URI, config.DB_NAME, config.COLLECTION_NAME)
+            corpus.refresh()
+    except Exception as e:
+        st.warning(f"⚠️ In-memory resume corpus unavailable, querying the database instead: {e}")
+        corpus = None
     try:
         with st.spinner("Connecting to database..."):
-            client = MongoClient(config.MONGO_URI)
-            coll = client[config.DB_NAME][config.COLLECTION_NAME]
-            docs = list(coll.find({}))
-            st.success(f"📁 Loaded {len(docs)} resumes from database")
+            if corpus is not None:
+                coll = corpus.collection
+                vocabulary = corpus
+            else:
+                client = MongoClient(config.MONGO_URI)
+                coll = client[config.DB_NAME][config.COLLECTION_NAME]
+                index = ResumeSearchIndex.for_collection(config.DB_NAME, config.COLLECTION_NAME)
+                vocabulary = index if index.doc_count() else None
+            # Add aliases and, for terms missing from the corpus vocabulary, close spellings
+            parsed_query, expansions = expand_query(parsed_query, bsp.quoted_phrases, vocabulary=vocabulary)
+            if expansions:
+                st.caption("🔁 Also searching: " + "; ".join(
+                    f"{term} → {', '.join(alternatives)}" for term, alternatives in expansions.items()
+                ))
+            if corpus is not None:
+                docs = corpus.documents(corpus.search(parsed_query, bsp.quoted_phrases))
+                stale_ids = [doc["_id"] for doc in docs if doc["stale"]]
+                if stale_ids:
+                    # Written since the last refresh by an older normalize(): repair them
+                    # through the corpus and search again on the new tokens
+                    corpus.repair(stale_ids)
+                    docs = corpus.documents(corpus.search(parsed_query, bsp.quoted_phrases))
+                st.success(f"📁 Found {len(docs)} candidate resumes in memory ({len(corpus)} resumes, {corpus.mode})")
+            else:
+                docs = load_candidates_from_database(coll, index, parsed_query, bsp.quoted_phrases)
+                st.success(f"📁 Loaded {len(docs)} candidate resumes from the database")
     except Exception as e:
         st.error(f"❌ Failed to load resumes: {e}")
         return
+    if corpus is None:
+        repair_stale_search_fields(coll, docs)
 
     # Search resumes
     st.subheader("🔍 Searching resumes...")
@@ -535,7 +802,16 @@ def main():
     
     # Store unique documents using a dictionary with _id as key
     unique_matching_docs = {}
+    matched_docs = {}
     doc_ranks = {}  # Store ranks for each document
+    match_names = {}  # Lowercased names for tie-breaking
+    matcher = CompiledQuery(parsed_query, bsp.quoted_phrases,
+                            containing=corpus.tokens_containing if corpus is not None else None)
+    search_terms = matcher.terms
+    token_streams = {}
+    if corpus is not None and matcher.needs_text:
+        # Corpus entries keep token sets only; phrases need the stored token order
+        token_streams = corpus.token_streams(doc["_id"] for doc in docs)
     
     for idx, doc in enumerate(docs):
         try:
@@ -545,41 +821,69 @@ def main():
             if doc_id in unique_matching_docs:
                 continue
                 
-            raw_text = flatten_json(doc)
-            norm_text = normalize(raw_text)
+            # Joined only if a phrase or substring term needs the text
+            tokens = token_streams.get(doc_id) or doc.get("search_tokens") or []
+            norm_text = lambda tokens=tokens: " ".join(tokens)
             
             # Debug output for search terms
             if st.session_state.get('debug_search', False):
                 st.write(f"Searching in document {doc_id}:")
-                st.write(f"Normalized text: {norm_text[:200]}...")
+                st.write(f"Normalized text: {norm_text()[:200]}...")
             
-            if evaluate_expression(parsed_query, norm_text, bsp.quoted_phrases):
-                unique_matching_docs[doc_id] = doc
-                # Extract search terms for highlighting
-                search_terms = extract_search_terms(parsed_query, bsp.quoted_phrases)
-                st.session_state[f"matched_terms_{doc_id}"] = search_terms
-                
-                # Calculate rank for this document
-                rank = calculate_rank(doc, search_terms, norm_text)
-                doc_ranks[doc_id] = rank
-                
-                # Pre-highlight the entire document
-                highlighted_doc = highlight_dict_values(doc, search_terms)
-                st.session_state[f"highlighted_doc_{doc_id}"] = highlighted_doc
+            if matcher.matches(norm_text, doc.get("token_set") or tokens):
+                unique_matching_docs[doc_id] = doc["_id"]
+                matched_docs[doc_id] = doc
+                match_names[doc_id] = str(doc.get('name') or '').lower()
         except Exception as e:
             st.warning(f"⚠️ Error processing document {doc.get('_id')}: {e}")
         progress_bar.progress((idx + 1) / len(docs))
 
     progress_bar.empty()
 
-    # Get list of unique matching documents and sort by rank
-    matching_docs_list = list(unique_matching_docs.values())
+    # BM25F relevance from the stored per-field term counts; document frequencies and
+    # field lengths come from the corpus or the local inverted index, and only from the
+    # loaded candidates while the index is still empty
+    from bm25 import BM25FScorer, CorpusStats
+    if corpus is not None:
+        stats = corpus.stats()
+    elif index.doc_count():
+        stats = index.stats()
+    else:
+        stats = CorpusStats.from_documents(docs)
+    scorer = BM25FScorer(search_terms, stats, substring_terms=matcher.substring_terms)
+    for doc_id, doc in matched_docs.items():
+        doc_ranks[doc_id] = scorer.score(doc.get("field_tf"))
+
+    # Rank with a bounded heap: only the results up to the current page are ordered.
     # Sort by rank in descending order, then by name for ties
-    matching_docs_list.sort(key=lambda x: (-doc_ranks[str(x.get('_id'))], x.get('name', '').lower()))
+    total_matches = len(doc_ranks)
+    num_pages = max(1, math.ceil(total_matches / RESULTS_PAGE_SIZE))
+    page = min(st.session_state.get("search_page", 0), num_pages - 1)
+    ranked = heapq.nsmallest(
+        (page + 1) * RESULTS_PAGE_SIZE,
+        ((-rank, match_names[doc_id], doc_id) for doc_id, rank in doc_ranks.items()),
+    )
+    page_ids = [doc_id for _, _, doc_id in ranked[page * RESULTS_PAGE_SIZE:]]
+
+    # Fetch full resumes for the current page only
+    try:
+        page_bodies = {
+            str(doc.get('_id')): doc
+            for doc in coll.find({"_id": {"$in": [unique_matching_docs[i] for i in page_ids]}}, DERIVED_FIELDS_PROJECTION)
+        } if page_ids else {}
+    except Exception as e:
+        st.error(f"❌ Failed to load matching resumes: {e}")
+        return
+    matching_docs_list = [page_bodies[doc_id] for doc_id in page_ids if doc_id in page_bodies]
 
     # Display results
     if matching_docs_list:
-        st.markdown(f"<div class='result-count'>✅ Found {len(matching_docs_list)} matching candidates</div>", unsafe_allow_html=True)
+        first = page * RESULTS_PAGE_SIZE + 1
+        st.markdown(
+            f"<div class='result-count'>✅ Found {total_matches} matching candidates "
+            f"(showing {first}–{first + len(page_ids) - 1})</div>",
+            unsafe_allow_html=True
+        )
         
         # Create tabs for different views
         tab1, tab2 = st.tabs(["Card View", "Table View"])
@@ -588,7 +892,7 @@ def main():
             # Card view
             for doc in matching_docs_list:
                 doc_id = str(doc.get('_id'))
-                matched_terms = st.session_state.get(f"matched_terms_{doc_id}", set())
+                matched_terms = search_terms
                 rank = doc_ranks[doc_id]
                 
                 with st.container():
@@ -605,7 +909,7 @@ def main():
                             📱 {phone}
                         </div>
                         <div class="rank-info">
-                            Number of Matches: {rank}
+                            Relevance: {rank:.2f}
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
@@ -635,10 +939,8 @@ def main():
                             tabs = st.tabs(["Formatted View", "JSON View"])
                             
                             with tabs[0]:
-                                # Formatted structured view
-                                doc_id = str(doc.get('_id'))
-                                matched_terms = st.session_state.get(f"matched_terms_{doc_id}", set())
-                                highlighted_doc = st.session_state.get(f"highlighted_doc_{doc_id}", doc)
+                                # Formatted structured view, highlighted only once the panel is opened
+                                highlighted_doc = get_highlighted_doc(doc, search_terms, search_query)
                                 
                                 render_formatted_resume(highlighted_doc)
                             
@@ -667,6 +969,17 @@ def main():
                 table_data.append(row)
             
             st.dataframe(table_data, use_container_width=True)
+
+        # Page navigation; the next page's bodies are fetched on the rerun
+        if num_pages > 1:
+            nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+            if nav_prev.button("◀ Previous", disabled=page == 0, key="search_prev_page"):
+                st.session_state.search_page = page - 1
+                st.rerun()
+            nav_info.markdown(f"<div style='text-align: center;'>Page {page + 1} of {num_pages}</div>", unsafe_allow_html=True)
+            if nav_next.button("Next ▶", disabled=page >= num_pages - 1, key="search_next_page"):
+                st.session_state.search_page = page + 1
+                st.rerun()
     else:
         st.info("🔎 No resumes matched your search query. Try adjusting your terms.")
         st.markdown("""
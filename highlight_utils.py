@@ -0,0 +1,45 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+
+class MultiTermHighlighter:
+    """Wraps every occurrence of a set of terms in one pass over the text.
+
+    All terms are combined into a single case-insensitive alternation ordered
+    longest-first, so overlapping terms resolve to the longest match
+    ("machine learning" before "machine"). A match must not touch another
+    letter or digit on either side, which keeps whole-word behaviour for terms
+    like "C++", ".NET" or "Node.js" where `\\b` does not apply. The matched
+    text keeps its original case.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        unique_terms = {term.strip() for term in terms if isinstance(term, str) and term.strip()}
+        self.terms = sorted(unique_terms, key=lambda t: (-len(t), t.lower()))
+        self.pattern = None
+        if self.terms:
+            alternation = "|".join(re.escape(term) for term in self.terms)
+            self.pattern = re.compile(r"(?<![A-Za-z0-9])(?:" + alternation + r")(?![A-Za-z0-9])", re.IGNORECASE)
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Non-overlapping (start, end) offsets of every match."""
+        if not self.pattern or not text:
+            return []
+        return [match.span() for match in self.pattern.finditer(text)]
+
+    def wrap(self, text: str, open_tag: str, close_tag: str) -> str:
+        """Return text with every match wrapped in open_tag/close_tag."""
+        if not self.pattern or not text:
+            return text
+        return self.pattern.sub(lambda m: f"{open_tag}{m.group(0)}{close_tag}", text)
+
+
+@lru_cache(maxsize=256)
+def _cached_highlighter(terms: frozenset) -> MultiTermHighlighter:
+    return MultiTermHighlighter(terms)
+
+
+def get_highlighter(terms: Iterable[str]) -> MultiTermHighlighter:
+    """Shared highlighter for a set of terms, compiled once per distinct set."""
+    return _cached_highlighter(frozenset(terms or ()))
@@ -0,0 +1,237 @@
+import re
+import json
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from llama_resume_parser import ResumeParser
+from OCR_resume_parser import ResumeParserwithOCR
+from standardizer import ResumeStandardizer
+from db_manager import ResumeDBManager
+
+
+def employee_id_from_filename(file_name: str) -> Optional[str]:
+    """Pick the trailing employee number out of names like 'Jane_Doe_900249.pdf'."""
+    match = re.search(r"(?:^|[_\-\s])(\d+)$", Path(file_name).stem)
+    return match.group(1) if match else None
+
+
+def make_job(file_path, original_filename: str = None, employee_id: str = None) -> Dict:
+    """Describe one resume file for the pipeline."""
+    file_path = Path(file_path)
+    return {
+        "file_path": file_path,
+        "file_name": original_filename or file_path.name,
+        "employee_id": employee_id,
+        "status": "pending",
+        "stage": None,
+        "error": None,
+        "cache_hit": False,
+        "resume_id": None,
+        "output_path": None,
+    }
+
+
+class ResumeIngestionPipeline:
+    """Parse -> standardize -> upsert as overlapping stages joined by bounded queues.
+
+    Each stage has its own worker count, so a batch is limited by the slowest
+    stage's throughput instead of the sum of all per-file latencies. Blocking
+    work (LlamaParse/OCR, pymongo) runs in threads; the Azure standardization
+    calls are already async and run directly on the event loop.
+    """
+
+    def __init__(self, parse_workers: int = 4, standardize_workers: int = 8, upsert_workers: int = 1,
+                 queue_size: int = 16, output_dir=None,
+                 progress_callback: Optional[Callable[[Dict, int, int], None]] = None):
+        self.parse_workers = parse_workers
+        self.standardize_workers = standardize_workers
+        self.upsert_workers = upsert_workers
+        self.queue_size = queue_size
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.progress_callback = progress_callback
+        self.standardizer = ResumeStandardizer()
+        self.db_manager = ResumeDBManager()
+        self._completed = 0
+        self._total = 0
+        # insert_or_update_resume is find_one-then-write, so resumes sharing an identity
+        # must not be upserted concurrently or both can miss and insert a duplicate
+        self._identity_locks: Dict[str, asyncio.Lock] = {}
+
+        if self.output_dir:
+            (self.output_dir / "parsed").mkdir(parents=True, exist_ok=True)
+            (self.output_dir / "standardized").mkdir(parents=True, exist_ok=True)
+
+    # -------------------
+    # Stage workers
+    # -------------------
+    def _parse_file(self, job: Dict, use_ocr: bool = False) -> Optional[Dict]:
+        file_path = job["file_path"]
+        if use_ocr:
+            parsed = ResumeParserwithOCR().parse_resume(file_path)
+        else:
+            parser = ResumeParser()  # One instance per call to avoid sharing event loops across threads
+            if file_path.suffix.lower() not in parser.SUPPORTED_EXTENSIONS:
+                raise ValueError(f"Unsupported file type {file_path.suffix}")
+            parsed = parser.parse_resume(str(file_path))
+        if not parsed or not parsed.get("content", "").strip():
+            return None
+        parsed["timestamp"] = datetime.now().isoformat()
+        parsed["original_filename"] = job["file_name"]
+        if self.output_dir:
+            output_path = self.output_dir / "parsed" / f"{file_path.stem}.json"
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(parsed, f, indent=2, ensure_ascii=False)
+        return parsed
+
+    async def _parse(self, job: Dict) -> bool:
+        job["stage"] = "parse"
+        parsed = await asyncio.to_thread(self._parse_file, job)
+        job["used_ocr"] = False
+        if parsed is None:
+            # Fall back to OCR for scans and files LlamaParse could not read
+            parsed = await asyncio.to_thread(self._parse_file, job, True)
+            job["used_ocr"] = True
+        if parsed is None:
+            raise ValueError("No content extracted")
+        job["parsed"] = parsed
+        return True
+
+    async def _standardize(self, job: Dict) -> bool:
+        job["stage"] = "standardize"
+        parsed = job["parsed"]
+        resume, _, cache_hit = await self.standardizer.standardize_content(parsed["content"], parsed.get("links", []))
+
+        name = resume.get("name") or ""
+        if (not name.split() or len(name.split()[0]) < 2) and not job["used_ocr"]:
+            # Same recovery as the single-upload flow: re-parse with OCR when the name is missing
+            ocr_parsed = await asyncio.to_thread(self._parse_file, job, True)
+            if ocr_parsed:
+                job["used_ocr"] = True
+                resume, _, cache_hit = await self.standardizer.standardize_content(
+                    ocr_parsed["content"], ocr_parsed.get("links", [])
+                )
+
+        resume["timestamp"] = datetime.now().isoformat()
+        resume["source_file"] = str(job["file_path"])
+        resume["original_filename"] = job["file_name"]
+        if job["employee_id"]:
+            resume["employee_id"] = job["employee_id"]
+        if self.output_dir:
+            output_path = self.output_dir / "standardized" / f"{job['file_path'].stem}.json"
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(resume, f, indent=2, ensure_ascii=False)
+            job["output_path"] = output_path
+        job["cache_hit"] = cache_hit
+        job["resume"] = resume
+        return True
+
+    async def _upsert(self, job: Dict) -> bool:
+        job["stage"] = "upsert"
+        query = ResumeDBManager.identity_query(job["resume"])
+        identity = json.dumps(query, sort_keys=True, default=str) if query else None
+        lock = self._identity_locks.setdefault(identity, asyncio.Lock()) if identity else asyncio.Lock()
+        async with lock:
+            resume_id = await asyncio.to_thread(self.db_manager.insert_or_update_resume, job["resume"])
+        job["resume_id"] = str(resume_id)
+        job["status"] = "uploaded"
+        return True
+
+    # -------------------
+    # Orchestration
+    # -------------------
+    def _finish(self, job: Dict):
+        # Drop the bulky intermediate payloads once a job leaves the pipeline
+        job.pop("parsed", None)
+        job.pop("resume", None)
+        self._completed += 1
+        if self.progress_callback:
+            self.progress_callback(job, self._completed, self._total)
+
+    async def _stage(self, worker, in_queue: asyncio.Queue, out_queue: Optional[asyncio.Queue]):
+        while True:
+            job = await in_queue.get()
+            if job is None:
+                break
+            try:
+                await worker(job)
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                print(f"❌ {job['stage']} failed for {job['file_name']}: {e}")
+            if job["status"] != "failed" and out_queue is not None:
+                await out_queue.put(job)
+            else:
+                self._finish(job)
+
+    async def run(self, jobs: List[Dict]) -> List[Dict]:
+        """Push every job through the three stages and return them with their outcome."""
+        self._completed = 0
+        self._total = len(jobs)
+        parse_queue = asyncio.Queue(maxsize=self.queue_size)
+        standardize_queue = asyncio.Queue(maxsize=self.queue_size)
+        upsert_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        stages = [
+            (self._parse, parse_queue, standardize_queue, self.parse_workers),
+            (self._standardize, standardize_queue, upsert_queue, self.standardize_workers),
+            (self._upsert, upsert_queue, None, self.upsert_workers),
+        ]
+        stage_tasks = [
+            [asyncio.create_task(self._stage(worker, in_q, out_q)) for _ in range(count)]
+            for worker, in_q, out_q, count in stages
+        ]
+
+        for job in jobs:
+            await parse_queue.put(job)
+        # Shut the stages down in order: a stage stops only after its upstream has drained
+        for (_, in_queue, _, count), tasks in zip(stages, stage_tasks):
+            for _ in range(count):
+                await in_queue.put(None)
+            await asyncio.gather(*tasks)
+
+        uploaded = sum(1 for job in jobs if job["status"] == "uploaded")
+        cached = sum(1 for job in jobs if job["cache_hit"])
+        print(f"\n📊 Summary: Total = {len(jobs)}, Uploaded = {uploaded}, "
+              f"Failed = {len(jobs) - uploaded}, Standardization cache hits = {cached}")
+        return jobs
+
+    def run_sync(self, jobs: List[Dict]) -> List[Dict]:
+        return asyncio.run(self.run(jobs))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless bulk resume ingestion: parse -> standardize -> MongoDB")
+    parser.add_argument("--folder", required=True, help="Folder containing resume files (PDF/DOCX)")
+    parser.add_argument("--parse-workers", type=int, default=4)
+    parser.add_argument("--standardize-workers", type=int, default=8)
+    parser.add_argument("--upsert-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=16, help="Max items buffered between stages")
+    parser.add_argument("--output-dir", help="Optional folder to keep parsed/standardized JSON files")
+    parser.add_argument("--employee-id-from-filename", action="store_true",
+                        help="Use the trailing number in each file name as the Employee ID")
+    args = parser.parse_args()
+
+    files = sorted(p for p in Path(args.folder).iterdir() if p.suffix.lower() in {".pdf", ".docx"})
+    print(f"📂 Found {len(files)} resumes to ingest.\n")
+    jobs = [
+        make_job(p, employee_id=employee_id_from_filename(p.name) if args.employee_id_from_filename else None)
+        for p in files
+    ]
+
+    def report(job, completed, total):
+        status = "✅" if job["status"] == "uploaded" else f"❌ ({job['stage']}: {job['error']})"
+        print(f"[{completed}/{total}] {job['file_name']} {status}")
+
+    pipeline = ResumeIngestionPipeline(
+        parse_workers=args.parse_workers,
+        standardize_workers=args.standardize_workers,
+        upsert_workers=args.upsert_workers,
+        queue_size=args.queue_size,
+        output_dir=args.output_dir,
+        progress_callback=report
+    )
+    pipeline.run_sync(jobs)
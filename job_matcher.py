@@ -1,6 +1,12 @@
+import copy
 import json
 import re
-from typing import List, Dict, Set, Tuple
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Optional, Set, Tuple
+import numpy as np
 from pymongo import MongoClient
 import streamlit as st
 import config
@@ -9,16 +15,148 @@ from openai import AzureOpenAI
 from bson.objectid import ObjectId
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from final_retriever import canonical_phrase, DERIVED_FIELDS, DERIVED_FIELDS_PROJECTION, strip_derived_fields
+from cache_utils import SQLiteCache
+from term_expansion import expand_keywords
+from vector_index import semantic_top_n as semantic_top_n_setting
+
+# Candidate reads keep the normalized skill/technology arrays for pre-scoring;
+# they are stripped again before a resume is shown or retailored
+CANDIDATE_PROJECTION = {field: 0 for field in DERIVED_FIELDS if field not in ("skills_norm", "tech_norm")}
+
+
+def streamlit_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """Thread pool whose workers may still call st.* for the session that created it."""
+    return ThreadPoolExecutor(
+        max_workers=max_workers,
+        initializer=add_script_run_ctx,
+        initargs=(None, get_script_run_ctx())
+    )
+
+
+def keyword_terms(keyword: str) -> Set[str]:
+    """skills_norm / tech_norm values that stand for a JD keyword, its aliases included."""
+    return {t for k in expand_keywords([keyword]) for t in (k.strip().lower(), canonical_phrase(k)) if t}
+
+
+def skill_filter(keywords) -> dict:
+    """The pre-filter's MongoDB query: any keyword (or alias) among skills_norm or tech_norm."""
+    terms = sorted({t for k in keywords if isinstance(k, str) for t in keyword_terms(k)})
+    return {
+        "$or": [
+            # Match in normalized skills
+            {"skills_norm": {"$in": terms}},
+            # Match in normalized project technologies / descriptions
+            {"tech_norm": {"$in": terms}}
+        ]
+    }
+
+
+def prescore_settings() -> dict:
+    """The optional [prescore] secrets section (top_k, min_score)."""
+    try:
+        return dict(st.secrets.get("prescore", {}))
+    except Exception:
+        return {}
 
 class JobDescriptionAnalyzer:
-    def __init__(self):
+    # Bump when the keyword prompt changes so stale extractions are not reused
+    KEYWORD_PROMPT_VERSION = "1"
+    KEYWORD_CACHE_PATH = Path("data2/cache/jd_keywords_cache.sqlite3")
+    KEYWORD_CACHE_MEMORY_SIZE = 256
+    KEYWORD_CACHE_MAX_ENTRIES = 5000
+    KEYWORD_CACHE_MAX_AGE_DAYS = 30
+
+    # In-process LRU shared by every analyzer (and every Streamlit session) in this process
+    _memory_cache: "OrderedDict[str, list]" = OrderedDict()
+    _cache_lock = threading.Lock()
+    cache_stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    def __init__(self, persistent_cache: bool = True):
         self.client = AzureOpenAI(
             api_key=st.secrets["azure_openai"]["api_key"],
             api_version=st.secrets["azure_openai"]["api_version"],
             azure_endpoint=st.secrets["azure_openai"]["endpoint"]
         )
-        
-    def extract_keywords(self, job_description: str) -> Dict[str, Set[str]]:
+        self.persistent_cache = None
+        if persistent_cache:
+            try:
+                self.persistent_cache = SQLiteCache(
+                    self.KEYWORD_CACHE_PATH,
+                    table="jd_keywords",
+                    max_entries=self.KEYWORD_CACHE_MAX_ENTRIES,
+                    max_age_seconds=self.KEYWORD_CACHE_MAX_AGE_DAYS * 24 * 3600
+                )
+            except Exception as e:
+                print(f"⚠️ Keyword cache unavailable, using in-memory cache only: {e}")
+
+    @classmethod
+    def cache_key(cls, job_description: str) -> str:
+        """Hash of the JD with case and whitespace differences normalized away."""
+        normalized = " ".join(job_description.split()).casefold()
+        payload = json.dumps({
+            "jd": normalized,
+            "prompt_version": cls.KEYWORD_PROMPT_VERSION,
+            "deployment": st.secrets["azure_openai"]["deployment"],
+        })
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def cache_info(cls) -> Dict[str, int]:
+        """Hit/miss counters of the keyword cache since the process started."""
+        with cls._cache_lock:
+            return {**cls.cache_stats, "memory_entries": len(cls._memory_cache)}
+
+    @classmethod
+    def _remember(cls, key: str, keywords: list):
+        with cls._cache_lock:
+            cls._memory_cache[key] = keywords
+            cls._memory_cache.move_to_end(key)
+            while len(cls._memory_cache) > cls.KEYWORD_CACHE_MEMORY_SIZE:
+                cls._memory_cache.popitem(last=False)
+
+    def _cached_keywords(self, key: str):
+        with self._cache_lock:
+            if key in self._memory_cache:
+                self._memory_cache.move_to_end(key)
+                self.cache_stats["memory_hits"] += 1
+                return self._memory_cache[key]
+        if self.persistent_cache is not None:
+            try:
+                keywords = self.persistent_cache.get(key)
+            except Exception as e:
+                print(f"⚠️ Keyword cache read failed: {e}")
+                keywords = None
+            if keywords is not None:
+                with self._cache_lock:
+                    self.cache_stats["persistent_hits"] += 1
+                self._remember(key, keywords)
+                return keywords
+        with self._cache_lock:
+            self.cache_stats["misses"] += 1
+        return None
+
+    def extract_keywords(self, job_description: str, use_cache: bool = True) -> Dict[str, Set[str]]:
+        """Extract keywords from job description, reusing cached extractions of the same JD."""
+        key = self.cache_key(job_description) if use_cache else None
+        keywords = self._cached_keywords(key) if use_cache else None
+        if keywords is None:
+            result = self._extract_keywords_uncached(job_description)
+            # Failed extractions come back empty and are not cached
+            if use_cache and result["keywords"]:
+                keywords = sorted(result["keywords"])
+                self._remember(key, keywords)
+                if self.persistent_cache is not None:
+                    try:
+                        self.persistent_cache.set(key, keywords, tag=self.KEYWORD_PROMPT_VERSION)
+                    except Exception as e:
+                        print(f"⚠️ Keyword cache write failed: {e}")
+            return result
+        return {"keywords": set(keywords), "technologies": set(keywords)}
+
+    def _extract_keywords_uncached(self, job_description: str) -> Dict[str, Set[str]]:
         """Extract keywords from job description using Azure OpenAI."""
         prompt = f"""You are an AI assistant that extracts ONLY the most relevant and specific keywords from job descriptions. Focus on extracting:
 1. Required technical skills and technologies
@@ -576,14 +714,147 @@ Keywords: {keywords}
             return original_description
 
 class CandidateScorer:
-    def __init__(self, job_keywords: Dict[str, Set[str]]):
+    MAX_RATE_LIMIT_RETRIES = 5
+    MAX_BACKOFF_SECONDS = 60
+    # Batched scoring: candidates per prompt and a rough cap on the candidate payload size
+    SCORING_BATCH_SIZE = 5
+    BATCH_TOKEN_BUDGET = 12000
+    # Bump when the scoring prompt or guidelines change so cached scores are not reused
+    SCORING_PROMPT_VERSION = "1"
+    SCORE_CACHE_PATH = Path("data2/cache/candidate_scores.sqlite3")
+    SCORE_CACHE_MAX_ENTRIES = 100000
+    SCORE_CACHE_MAX_AGE_DAYS = 30
+
+    _score_cache = None
+    _score_cache_lock = threading.Lock()
+
+    SCORING_GUIDELINES = """Evaluation Guidelines:
+1. Primary Focus (80% of score): Skills match with job requirements, Project relevance and implementation of required technologies
+2. Secondary Focus (20% of score): Education relevance, Experience relevance, Certifications
+
+Scoring Rules:
+- Score range: 1-100
+- Focus on exact matches and closely related technologies
+- Higher scores for candidates with multiple, highly relevant matches
+- Lower scores for partial matches or minimal alignment
+- Do not assume or hallucinate missing information
+- Explicitly mention missing required skills in the reason
+
+Status Rules: "Accepted" if score > 70, "Rejected" if score ≤ 70"""
+
+    def __init__(self, job_keywords: Dict[str, Set[str]], client: AzureOpenAI = None):
         self.job_keywords = job_keywords
-        self.client = AzureOpenAI(
+        # A single client can be shared by all scoring threads; retries are handled below
+        self.client = client or self.create_client()
+
+    @classmethod
+    def score_cache(cls):
+        """The SQLite score cache shared by every scorer in this process (None if it cannot be opened)."""
+        with cls._score_cache_lock:
+            if cls._score_cache is None:
+                try:
+                    cls._score_cache = SQLiteCache(
+                        cls.SCORE_CACHE_PATH,
+                        table="candidate_scores",
+                        max_entries=cls.SCORE_CACHE_MAX_ENTRIES,
+                        max_age_seconds=cls.SCORE_CACHE_MAX_AGE_DAYS * 24 * 3600
+                    )
+                except Exception as e:
+                    print(f"⚠️ Score cache unavailable, scoring every candidate: {e}")
+            return cls._score_cache
+
+    @classmethod
+    def evict_cached_scores(cls, resume_ids) -> int:
+        """Drop cached scores of resumes that were modified or deleted."""
+        cache = cls.score_cache()
+        if cache is None:
+            return 0
+        try:
+            return cache.delete_tags(str(resume_id) for resume_id in resume_ids)
+        except Exception as e:
+            print(f"⚠️ Score cache eviction failed: {e}")
+            return 0
+
+    @staticmethod
+    def content_hash(candidate: Dict) -> str:
+        """Hash of the resume content the scoring prompt sees."""
+        payload = {field: candidate.get(field) for field in ("name", "skills", "projects")}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def score_cache_key(self, candidate: Dict) -> str:
+        """(JD keyword set, resume content, prompt version, deployment) hash of a score."""
+        keywords = sorted({k.strip().casefold() for k in self.job_keywords["keywords"] if isinstance(k, str)})
+        payload = json.dumps({
+            "keywords": keywords,
+            "resume": self.content_hash(candidate),
+            "prompt_version": self.SCORING_PROMPT_VERSION,
+            "deployment": st.secrets["azure_openai"]["deployment"],
+        })
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cached_scores(self, candidates: List[Dict]) -> Dict[int, Tuple[int, str]]:
+        """Cached (score, reason) by position in candidates, for those scored before."""
+        cache = self.score_cache()
+        if cache is None or not candidates:
+            return {}
+        keys = [self.score_cache_key(candidate) for candidate in candidates]
+        try:
+            found = cache.get_many(keys)
+        except Exception as e:
+            print(f"⚠️ Score cache read failed: {e}")
+            return {}
+        return {i: tuple(found[key]) for i, key in enumerate(keys) if key in found}
+
+    def remember_scores(self, scored: List[Tuple[Dict, int, str]]):
+        """Cache valid (candidate, score, reason) results, tagged with the resume id for eviction."""
+        cache = self.score_cache()
+        if cache is None:
+            return
+        entries = [
+            (self.score_cache_key(candidate), [score, reason], str(candidate.get("_id")))
+            for candidate, score, reason in scored
+            # Errors come back as score 0 and are retried next time
+            if self._valid_entry({"score": score, "reason": reason})
+        ]
+        try:
+            cache.set_many(entries)
+        except Exception as e:
+            print(f"⚠️ Score cache write failed: {e}")
+
+    @staticmethod
+    def create_client() -> AzureOpenAI:
+        return AzureOpenAI(
             api_key=st.secrets["azure_openai"]["api_key"],
             api_version=st.secrets["azure_openai"]["api_version"],
-            azure_endpoint=st.secrets["azure_openai"]["endpoint"]
+            azure_endpoint=st.secrets["azure_openai"]["endpoint"],
+            max_retries=0
         )
-        
+
+    def _retry_delay(self, error: openai.RateLimitError, attempt: int) -> float:
+        """Honour the server's Retry-After hint, else back off exponentially with jitter."""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return min(self.MAX_BACKOFF_SECONDS, float(headers["retry-after-ms"]) / 1000)
+            if headers.get("retry-after"):
+                return min(self.MAX_BACKOFF_SECONDS, float(headers["retry-after"]))
+        except ValueError:
+            pass
+        return min(self.MAX_BACKOFF_SECONDS, 2 ** attempt) + random.uniform(0, 1)
+
+    def _create_completion(self, **kwargs):
+        """Chat completion call that backs off and retries on 429 rate-limit responses."""
+        for attempt in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+            try:
+                return self.client.chat.completions.create(**kwargs)
+            except openai.RateLimitError as e:
+                if attempt == self.MAX_RATE_LIMIT_RETRIES:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                print(f"⏳ Rate limited by Azure OpenAI, retrying in {delay:.1f}s (attempt {attempt + 1})")
+                time.sleep(delay)
+
+
     def calculate_score(self, candidate: Dict) -> Tuple[int, str]:
         """Calculate a score for the candidate using Azure OpenAI."""
         # Prepare the evaluation data
@@ -601,19 +872,7 @@ class CandidateScorer:
         
         prompt = f"""You are an AI designed to evaluate candidate suitability for a job based on pre-extracted job description keywords. Compare the candidate's skills and projects against the job description keywords and assign a holistic match score.
 
-Evaluation Guidelines:
-1. Primary Focus (80% of score): Skills match with job requirements, Project relevance and implementation of required technologies
-2. Secondary Focus (20% of score): Education relevance, Experience relevance, Certifications
-
-Scoring Rules:
-- Score range: 1-100
-- Focus on exact matches and closely related technologies
-- Higher scores for candidates with multiple, highly relevant matches
-- Lower scores for partial matches or minimal alignment
-- Do not assume or hallucinate missing information
-- Explicitly mention missing required skills in the reason
-
-Status Rules: "Accepted" if score > 70, "Rejected" if score ≤ 70
+{self.SCORING_GUIDELINES}
 
 ### Job Description Keywords:
 {json.dumps(evaluation_data["job_description"])}
@@ -635,7 +894,7 @@ Status Rules: "Accepted" if score > 70, "Rejected" if score ≤ 70
 }}"""
         
         try:
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model=st.secrets["azure_openai"]["deployment"],
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
@@ -672,6 +931,192 @@ Status Rules: "Accepted" if score > 70, "Rejected" if score ≤ 70
             st.error(f"Error evaluating candidate: {str(e)}")
             return 0, f"Error during evaluation: {str(e)}"
 
+    @staticmethod
+    def estimate_tokens(candidate: Dict) -> int:
+        """Rough token count of a candidate's scoring payload (~4 characters per token)."""
+        payload = {"skills": candidate.get("skills", []), "projects": candidate.get("projects", [])}
+        return len(json.dumps(payload, default=str)) // 4
+
+    def make_batches(self, candidates: List[Dict], batch_size: int = None, token_budget: int = None) -> List[List[Dict]]:
+        """Pack candidates into prompts of at most batch_size entries and token_budget payload tokens."""
+        batch_size = batch_size or self.SCORING_BATCH_SIZE
+        token_budget = token_budget or self.BATCH_TOKEN_BUDGET
+        batches, current, current_tokens = [], [], 0
+        for candidate in candidates:
+            tokens = self.estimate_tokens(candidate)
+            if current and (len(current) >= batch_size or current_tokens + tokens > token_budget):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(candidate)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _valid_entry(entry) -> bool:
+        if not isinstance(entry, dict) or not isinstance(entry.get("reason"), str):
+            return False
+        try:
+            return 1 <= float(entry.get("score")) <= 100
+        except (TypeError, ValueError):
+            return False
+
+    def calculate_scores(self, candidates: List[Dict]) -> List[Tuple[int, str]]:
+        """Score several candidates with one prompt, keyed by mongo_id.
+
+        Entries that are missing or fail validation are re-scored with
+        calculate_score, so the result always has one (score, reason) per candidate.
+        """
+        if len(candidates) == 1:
+            return [self.calculate_score(candidates[0])]
+
+        # Keys must be unique within the prompt to map answers back to candidates
+        keyed = {}
+        for i, candidate in enumerate(candidates):
+            key = str(candidate.get("_id", i))
+            keyed[key if key not in keyed else f"{key}#{i}"] = candidate
+        candidate_details = [
+            {
+                "mongo_id": key,
+                "name": candidate.get("name", "Unknown"),
+                "skills": candidate.get("skills", []),
+                "projects": candidate.get("projects", [])
+            }
+            for key, candidate in keyed.items()
+        ]
+
+        prompt = f"""You are an AI designed to evaluate candidate suitability for a job based on pre-extracted job description keywords. Compare each candidate's skills and projects against the job description keywords and assign each one a holistic match score. Evaluate every candidate independently.
+
+{self.SCORING_GUIDELINES}
+
+### Job Description Keywords:
+{json.dumps(list(self.job_keywords["keywords"]))}
+
+### Candidates:
+{json.dumps(candidate_details, default=str)}
+
+### Required Output Format (JSON):
+{{
+  "results": [
+    {{
+      "mongo_id": "<mongo_id of the candidate, copied exactly>",
+      "score": <number between 1 and 100>,
+      "reason": "<detailed explanation focusing on skills and projects matches>",
+      "status": "<'Accepted' if score > 70, 'Rejected' if score <= 70>"
+    }}
+  ]
+}}
+Return exactly one entry per candidate."""
+
+        entries = {}
+        try:
+            response = self._create_completion(
+                model=st.secrets["azure_openai"]["deployment"],
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                response_format={ "type": "json_object" }
+            )
+            results = json.loads(response.choices[0].message.content.strip()).get("results", [])
+            entries = {
+                str(entry.get("mongo_id")): entry
+                for entry in results if isinstance(entry, dict)
+            }
+        except Exception as e:
+            print(f"⚠️ Batched scoring failed for {len(candidates)} candidates, falling back to single calls: {e}")
+
+        scores = []
+        for key, candidate in keyed.items():
+            entry = entries.get(key)
+            if self._valid_entry(entry):
+                scores.append((int(float(entry["score"])), entry["reason"]))
+            else:
+                scores.append(self.calculate_score(candidate))
+        return scores
+
+class CandidatePreScorer:
+    """Cheap deterministic ranking of pre-filtered candidates before any LLM call.
+
+    Each JD keyword is a column; a candidate covers it fully when it is one of their
+    skills and partly when it only appears in project technologies or descriptions.
+    Columns are weighted by the keyword's idf over the whole collection, so one
+    generic keyword counts for little, and the pre-score is the weighted coverage (0-100).
+    """
+
+    SKILL_HIT = 1.0
+    PROJECT_HIT = 0.6
+    # No cap unless configured: every pre-filtered candidate is LLM-scored by default
+    DEFAULT_TOP_K = None
+    DEFAULT_MIN_SCORE = 0.0
+
+    def __init__(self, keywords: Set[str]):
+        # Keywords that share lookup terms (e.g. "JS" and "JavaScript") are one column
+        columns: Dict[frozenset, str] = {}
+        for keyword in sorted(k for k in keywords or [] if isinstance(k, str) and k.strip()):
+            columns.setdefault(frozenset(keyword_terms(keyword)), keyword)
+        self.keywords = list(columns.values())
+        self._term_columns: Dict[str, List[int]] = {}
+        for column, terms in enumerate(columns):
+            for term in terms:
+                self._term_columns.setdefault(term, []).append(column)
+        self.weights = np.ones(len(self.keywords))
+
+    def fit(self, prefiltered: List[Dict], doc_count: int):
+        """Weight each keyword by its idf, log(1 + (N - df + 0.5) / (df + 0.5)).
+
+        prefiltered must be the whole pre_filter_candidates() result: every resume
+        that has any of the keywords is in it, so a keyword's document frequency in
+        the collection is the number of these candidates that cover it.
+        """
+        if not self.keywords:
+            return
+        df = (self._coverage(prefiltered) > 0).sum(axis=0)
+        # The estimated count may lag behind the documents just read
+        doc_count = max(doc_count, len(prefiltered))
+        self.weights = np.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+    def _hits(self, values, row: int, matrix: np.ndarray):
+        for term in values or []:
+            for column in self._term_columns.get(term, ()):
+                matrix[row, column] = 1.0
+
+    def _coverage(self, candidates: List[Dict]) -> np.ndarray:
+        skills = np.zeros((len(candidates), len(self.keywords)))
+        projects = np.zeros_like(skills)
+        for row, candidate in enumerate(candidates):
+            self._hits(candidate.get("skills_norm"), row, skills)
+            self._hits(candidate.get("tech_norm"), row, projects)
+        return np.maximum(self.SKILL_HIT * skills, self.PROJECT_HIT * projects)
+
+    def score(self, candidates: List[Dict]) -> np.ndarray:
+        """Pre-scores (0-100) of the candidates, in order."""
+        if not candidates or not self.keywords:
+            return np.zeros(len(candidates))
+        return 100.0 * (self._coverage(candidates) @ self.weights) / self.weights.sum()
+
+    def select(self, candidates: List[Dict], top_k: Optional[int] = None,
+               min_score: Optional[float] = None) -> Tuple[List[Tuple[Dict, float]], Dict]:
+        """Rank candidates by pre-score and keep those at or above min_score, at most top_k.
+
+        Returns ([(candidate, pre_score)] best first, summary of the cutoff).
+        """
+        scores = self.score(candidates)
+        order = np.argsort(-scores, kind="stable")
+        ranked = [(candidates[i], round(float(scores[i]), 1)) for i in order]
+        kept = [(c, s) for c, s in ranked if min_score is None or s >= min_score]
+        if top_k:
+            kept = kept[:top_k]
+        summary = {
+            "candidates": len(ranked),
+            "forwarded": len(kept),
+            "top_k": top_k,
+            "min_score": min_score,
+            # Lowest pre-score that still reached the LLM
+            "cutoff": kept[-1][1] if kept else None,
+        }
+        return kept, summary
+
+
 def convert_objectid_to_str(obj):
     if isinstance(obj, dict):
         return {k: convert_objectid_to_str(v) for k, v in obj.items()}
@@ -683,6 +1128,10 @@ def convert_objectid_to_str(obj):
         return obj
 
 class ResumeRetailor:
+    # Concurrent per-project LLM calls, and how long one candidate may wait for them
+    MAX_ENHANCEMENT_WORKERS = 8
+    ENHANCEMENT_DEADLINE_SECONDS = 60
+
     def __init__(self):
         self.client = AzureOpenAI(
             api_key=st.secrets["azure_openai"]["api_key"],
@@ -1051,11 +1500,12 @@ Return ONLY a number between 0.0 and 1.0 representing the relevance score."""
         if not all_projects:
             return []
         
-        # Score each project using LLM judge
-        project_scores = []
-        for proj in all_projects:
-            score = self.llm_judge_project_relevance(proj, job_keywords, job_description)
-            project_scores.append((proj, score))
+        # Score each project using LLM judge, all projects at once
+        with streamlit_thread_pool(self.MAX_ENHANCEMENT_WORKERS) as executor:
+            scores = list(executor.map(
+                lambda proj: self.llm_judge_project_relevance(proj, job_keywords, job_description), all_projects
+            ))
+        project_scores = list(zip(all_projects, scores))
         
         # Sort by relevance score (highest first) and take the top N
         project_scores.sort(key=lambda x: x[1], reverse=True)
@@ -1101,35 +1551,43 @@ Return ONLY a number between 0.0 and 1.0 representing the relevance score."""
         """
         safe_resume = convert_objectid_to_str(original_resume)
         
-        # Generate job-specific title
-        if job_description:
-            safe_resume["title"] = self.generate_job_specific_title(safe_resume, job_keywords, job_description)
-        
         # Extract ALL projects from both projects and experience sections
         all_projects = self.extract_all_projects(safe_resume)
         
         if job_description and job_keywords:
-            # When JD is provided: Select only relevant projects and enhance them
-            relevant_projects = self.select_relevant_projects(all_projects, job_keywords, job_description)
-            enhanced_projects = []
-            for proj in relevant_projects:
-                # UNIVERSAL title enhancement
-                enhanced_title = self.universal_enhance_project_title(proj)
-                proj_copy = proj.copy()
-                proj_copy['title'] = enhanced_title
-                # Enhance description with CAR strategy using JD keywords
-                enhanced_desc = self.enhance_project_description_car(proj, job_keywords, jd_given=True)
-                proj_copy['description'] = enhanced_desc
-                enhanced_projects.append(proj_copy)
+            # When JD is provided: Select only relevant projects and enhance their titles and descriptions
+            projects_to_enhance = self.select_relevant_projects(all_projects, job_keywords, job_description)
+            enhance_descriptions = True
         else:
-            # When no JD: Enhance titles only for all projects
-            enhanced_projects = []
-            for proj in all_projects:
-                enhanced_title = self.universal_enhance_project_title(proj)
-                proj_copy = proj.copy()
-                proj_copy['title'] = enhanced_title
-                # Description remains unchanged when no JD
-                enhanced_projects.append(proj_copy)
+            # When no JD: Enhance titles only for all projects, descriptions remain unchanged
+            projects_to_enhance = all_projects
+            enhance_descriptions = False
+        
+        # Every title / CAR / job-title call is independent, so dispatch them together
+        tasks = {}
+        if job_description:
+            # A snapshot: the task may outlive the deadline while safe_resume is updated below
+            tasks["job_title"] = (
+                self.generate_job_specific_title, (copy.deepcopy(safe_resume), job_keywords, job_description)
+            )
+        for i, proj in enumerate(projects_to_enhance):
+            tasks[("title", i)] = (self.universal_enhance_project_title, (proj,))
+            if enhance_descriptions:
+                tasks[("description", i)] = (self.enhance_project_description_car, (proj, job_keywords, True))
+        results = self._run_enhancements(tasks)
+        
+        # Generate job-specific title
+        if results.get("job_title"):
+            safe_resume["title"] = results["job_title"]
+        
+        enhanced_projects = []
+        for i, proj in enumerate(projects_to_enhance):
+            proj_copy = proj.copy()
+            # Calls that missed the deadline keep the original text
+            proj_copy['title'] = results.get(("title", i)) or proj.get('title', '')
+            if enhance_descriptions:
+                proj_copy['description'] = results.get(("description", i)) or proj.get('description', '')
+            enhanced_projects.append(proj_copy)
         
         # Update the resume with enhanced project titles (and descriptions if JD provided)
         safe_resume['projects'] = enhanced_projects
@@ -1199,6 +1657,28 @@ Return the complete resume with original skills kept as provided, ALL projects (
             st.error(f"Error retailoring resume: {str(e)}")
             return safe_resume
     
+    def _run_enhancements(self, tasks: Dict) -> Dict:
+        """Run independent LLM calls concurrently; calls unfinished at the deadline are left out."""
+        if not tasks:
+            return {}
+        executor = streamlit_thread_pool(min(self.MAX_ENHANCEMENT_WORKERS, len(tasks)))
+        try:
+            futures = {executor.submit(fn, *args): key for key, (fn, args) in tasks.items()}
+            done, not_done = wait(futures, timeout=self.ENHANCEMENT_DEADLINE_SECONDS)
+            results = {}
+            for future in done:
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"⚠️ Resume enhancement {futures[future]} failed: {e}")
+            if not_done:
+                print(f"⚠️ {len(not_done)} resume enhancements missed the "
+                      f"{self.ENHANCEMENT_DEADLINE_SECONDS}s deadline; keeping the original text")
+            return results
+        finally:
+            # Don't block on stragglers past the deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def _validate_resume_structure(self, original: Dict, retailored: Dict) -> bool:
         """Validate that the retailored resume maintains the original structure."""
         # Check if all original fields are present
@@ -1214,11 +1694,18 @@ Return the complete resume with original skills kept as provided, ALL projects (
         return True
 
 class JobMatcher:
+    # Upper bound on concurrent Azure OpenAI scoring requests
+    MAX_SCORING_WORKERS = 8
+
     def __init__(self):
         self.client = MongoClient(config.MONGO_URI)
         self.db = self.client[config.DB_NAME]
         self.collection = self.db[config.COLLECTION_NAME]
         self.resume_retailor = ResumeRetailor()
+        # Cutoff of the last pre-scoring pass (see CandidatePreScorer.select)
+        self.last_prescore = None
+        # (evaluated, total) of the current or last scoring run
+        self.scoring_progress = (0, 0)
         
     def pre_filter_candidates(self, keywords: Set[str]) -> List[Dict]:
         """Pre-filter candidates based on skills and projects."""
@@ -1226,24 +1713,14 @@ class JobMatcher:
             st.warning("No keywords extracted from job description")
             return []
             
-        # Convert keywords to lowercase for case-insensitive matching
-        keywords_lower = [k.lower() for k in keywords]
-        
-        # Build the MongoDB query
-        query = {
-            "$or": [
-                # Match in skills array
-                {"skills": {"$in": keywords_lower}},
-                # Match in projects description
-                {"projects.description": {"$regex": "|".join(keywords_lower), "$options": "i"}},
-                # Match in projects technologies
-                {"projects.technologies": {"$in": keywords_lower}}
-            ]
-        }
+        # Match the canonical forms written to skills_norm / tech_norm at ingestion,
+        # so the lookup is an indexed $in instead of a regex scan over every project
+        # (aliases included, so a "k8s" requirement also finds "Kubernetes")
+        query = skill_filter(keywords)
         
         try:
             # Execute the query with a limit
-            candidates = list(self.collection.find(query))
+            candidates = list(self.collection.find(query, CANDIDATE_PROJECTION))
             if not candidates:
                 st.info("No candidates found matching the keywords")
             return candidates
@@ -1251,58 +1728,192 @@ class JobMatcher:
             st.error(f"Error querying database: {str(e)}")
             return []
         
-    def find_matching_candidates(self, job_description: str, progress_bar=None, status_text=None) -> List[Dict]:
-        """Find and score candidates matching the job description."""
+    def semantic_candidates(self, job_description: str, keyword_candidates: List[Dict], top_n: int) -> List[Dict]:
+        """Cap the candidates sent to the LLM at the top_n closest to the JD by embedding.
+
+        The pool is the keyword matches plus the top_n nearest resumes overall, so
+        candidates that describe a skill in other words are found too.
+        """
+        from search_index import mongo_ids
+        from vector_index import get_vector_index
+        try:
+            index = get_vector_index(config.DB_NAME, config.COLLECTION_NAME)
+            index.sync(self.collection)
+            query_vector = index.embed_query(job_description)
+            keyword_ids = {str(c.get("_id")) for c in keyword_candidates}
+            pool = dict(index.search(query_vector, len(keyword_ids), candidate_ids=keyword_ids))
+            pool.update(index.search(query_vector, top_n))
+        except Exception as e:
+            st.warning(f"⚠️ Semantic retrieval unavailable, scoring keyword matches only: {e}")
+            return keyword_candidates
+        chosen = [doc_id for doc_id, _ in sorted(pool.items(), key=lambda item: (-item[1], item[0]))[:top_n]]
+
+        by_id = {str(c.get("_id")): c for c in keyword_candidates}
+        missing = [doc_id for doc_id in chosen if doc_id not in by_id]
+        if missing:
+            for doc in self.collection.find({"_id": {"$in": mongo_ids(missing)}}, CANDIDATE_PROJECTION):
+                by_id[str(doc["_id"])] = doc
+        candidates = [by_id[doc_id] for doc_id in chosen if doc_id in by_id]
+        st.info(
+            f"🧭 Semantic retrieval: scoring the {len(candidates)} closest of {len(keyword_candidates)} keyword "
+            f"matches and {len(missing)} semantic-only matches ({index.embedder.name})"
+        )
+        return candidates
+
+    def score_candidates(self, candidates: List[Dict], keywords: Dict[str, Set[str]], max_workers: int = None,
+                         batch_size: int = None, use_cache: bool = True):
+        """Score candidates on a bounded thread pool, yielding (candidate, score, reason) as each batch finishes.
+
+        Candidates are packed batch_size per prompt (CandidateScorer.SCORING_BATCH_SIZE
+        by default); pass batch_size=1 for one prompt per candidate. Scores cached for the
+        same keywords and resume content are yielded first without an LLM call. Closing
+        the generator early cancels the batches that have not started yet.
+        """
+        scorer = CandidateScorer(keywords)  # one shared client for every request
+        cached = scorer.cached_scores(candidates) if use_cache else {}
+        if cached:
+            st.info(f"♻️ Reusing {len(cached)} cached scores; {len(candidates) - len(cached)} candidates go to the LLM")
+            for i, (score, reason) in sorted(cached.items()):
+                yield candidates[i], score, reason
+        candidates = [candidate for i, candidate in enumerate(candidates) if i not in cached]
+        if not candidates:
+            return
+
+        def score_batch(batch):
+            results = scorer.calculate_scores(batch)
+            if use_cache:
+                # Cached from the worker, so batches still in flight after a cancel are kept
+                scorer.remember_scores([(candidate, score, reason) for candidate, (score, reason) in zip(batch, results)])
+            return results
+
+        max_workers = max_workers or self.MAX_SCORING_WORKERS
+        batches = scorer.make_batches(candidates, batch_size)
+        executor = streamlit_thread_pool(max_workers)
+        try:
+            futures = {executor.submit(score_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    st.error(f"Error evaluating {len(batch)} candidates: {str(e)}")
+                    results = [(0, f"Error during evaluation: {str(e)}")] * len(batch)
+                for candidate, (score, reason) in zip(batch, results):
+                    yield candidate, score, reason
+        finally:
+            # Reached early when the caller stops iterating: drop the batches not yet started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_matching_candidates(self, job_description: str, progress_bar=None, status_text=None,
+                                 max_workers: int = None, batch_size: int = None,
+                                 keywords: Dict[str, Set[str]] = None, semantic_top_n: int = None,
+                                 prescore_top_k: int = None, prescore_min_score: float = None,
+                                 use_cache: bool = True):
+        """Generator variant of find_matching_candidates: yields each scored candidate
+        (score > 0) as soon as its batch completes, in completion order.
+
+        Stop iterating (or close the generator) to cancel the remaining scoring;
+        self.scoring_progress holds (evaluated, total) so far.
+        """
+        self.scoring_progress = (0, 0)
         if not job_description.strip():
             st.error("Please provide a job description")
-            return []
+            return
             
         # Extract keywords from job description
-        analyzer = JobDescriptionAnalyzer()
-        keywords = analyzer.extract_keywords(job_description)
+        if keywords is None:
+            analyzer = JobDescriptionAnalyzer()
+            keywords = analyzer.extract_keywords(job_description)
         
         
         # Pre-filter candidates based on keywords
         candidates = self.pre_filter_candidates(keywords["keywords"])
+
+        # Rank the keyword matches by pre-score and apply the configured cutoff
+        settings = prescore_settings()
+        top_k = prescore_top_k if prescore_top_k is not None else settings.get("top_k", CandidatePreScorer.DEFAULT_TOP_K)
+        min_score = prescore_min_score if prescore_min_score is not None else float(
+            settings.get("min_score", CandidatePreScorer.DEFAULT_MIN_SCORE))
+        prescorer = CandidatePreScorer(keywords["keywords"])
+        try:
+            prescorer.fit(candidates, self.collection.estimated_document_count())
+        except Exception as e:
+            print(f"⚠️ Collection size unavailable, weighting keywords equally: {e}")
+        ranked, self.last_prescore = prescorer.select(candidates, int(top_k) if top_k else None, min_score)
+        candidates = [candidate for candidate, _ in ranked]
+        if len(candidates) < self.last_prescore["candidates"]:
+            st.info(
+                f"⚡ Pre-scoring: keeping the top {len(candidates)} of {self.last_prescore['candidates']} "
+                f"keyword matches (cutoff pre-score {self.last_prescore['cutoff']})"
+            )
+
+        top_n = semantic_top_n if semantic_top_n is not None else semantic_top_n_setting()
+        if top_n:
+            # Semantic-only matches have no keyword hits, so they keep their embedding order
+            candidates = self.semantic_candidates(job_description, candidates, top_n)
         
         if not candidates:
-            return []
+            if self.last_prescore["candidates"]:
+                st.warning("No candidates reached the minimum pre-score")
+            return
+        pre_scores = {
+            id(candidate): round(float(pre_score), 1)
+            for candidate, pre_score in zip(candidates, prescorer.score(candidates))
+        }
         
-        # Score each pre-filtered candidate
-        scored_candidates = []
+        # Score the pre-filtered candidates concurrently, updating progress as each one completes
         total_candidates = len(candidates)
-        
-        for idx, candidate in enumerate(candidates):
-            # Update progress
-            if progress_bar and status_text:
-                progress = (idx + 1) / total_candidates
-                progress_bar.progress(progress)
-                status_text.text(f"Evaluating candidate {idx + 1} of {total_candidates}")
-            
-            try:
-                scorer = CandidateScorer(keywords)
-                score, reason = scorer.calculate_score(candidate)
+        scoring = self.score_candidates(candidates, keywords, max_workers, batch_size, use_cache)
+        try:
+            for idx, (candidate, score, reason) in enumerate(scoring):
+                self.scoring_progress = (idx + 1, total_candidates)
+                if progress_bar and status_text:
+                    progress_bar.progress((idx + 1) / total_candidates)
+                    status_text.text(f"Evaluated {idx + 1} of {total_candidates} candidates")
                 
                 # Only include candidates with score > 0
                 if score > 0:
-                    scored_candidates.append({
+                    yield {
                         "mongo_id": str(candidate.get("_id")),
                         "name": candidate.get("name", "Unknown"),
                         "phone": candidate.get("phone", "N/A"),
                         "email": candidate.get("email", "N/A"),
                         "score": score,
+                        "pre_score": pre_scores.get(id(candidate), 0.0),
                         "reason": reason,
                         "status": "Accepted" if score > 70 else "Rejected",
-                        "resume": candidate
-                    })
-            except Exception as e:
-                st.error(f"Error evaluating candidate {candidate.get('name', 'Unknown')}: {str(e)}")
-                continue
-        
-        # Sort by score in descending order
-        scored_candidates.sort(key=lambda x: x["score"], reverse=True)
+                        "resume": strip_derived_fields(candidate)
+                    }
+        finally:
+            scoring.close()
+
+    @staticmethod
+    def rank_results(results: List[Dict]) -> List[Dict]:
+        """Scored candidates best first (LLM score, then pre-score)."""
+        return sorted(results, key=lambda x: (x["score"], x["pre_score"]), reverse=True)
+
+    def find_matching_candidates(self, job_description: str, progress_bar=None, status_text=None,
+                                 max_workers: int = None, batch_size: int = None,
+                                 keywords: Dict[str, Set[str]] = None, semantic_top_n: int = None,
+                                 prescore_top_k: int = None, prescore_min_score: float = None,
+                                 use_cache: bool = True) -> List[Dict]:
+        """Find and score candidates matching the job description.
+
+        Pass `keywords` when they were already extracted for this JD to skip the extraction call.
+        With semantic_top_n (or [semantic_search] top_n in secrets) only that many candidates,
+        picked by embedding similarity, are sent to the LLM scorer. Candidates are then ranked
+        by CandidatePreScorer and only the prescore_top_k best with a pre-score of at least
+        prescore_min_score (or [prescore] top_k / min_score in secrets) are scored by the LLM;
+        the cutoff is kept in self.last_prescore. With use_cache, scores of unchanged resumes
+        for the same keywords are reused from CandidateScorer's score cache.
+        See iter_matching_candidates to receive candidates as they are scored.
+        """
+        scored_candidates = self.rank_results(self.iter_matching_candidates(
+            job_description, progress_bar, status_text, max_workers, batch_size,
+            keywords, semantic_top_n, prescore_top_k, prescore_min_score, use_cache
+        ))
         
-        if not scored_candidates:
+        if not scored_candidates and self.scoring_progress[1]:
             st.warning("No candidates met the minimum score threshold")
             
         return scored_candidates 
@@ -1311,7 +1922,7 @@ class JobMatcher:
         """Retailor a specific candidate's resume."""
         try:
             # Find the candidate
-            candidate = self.collection.find_one({"_id": ObjectId(candidate_id)})
+            candidate = self.collection.find_one({"_id": ObjectId(candidate_id)}, DERIVED_FIELDS_PROJECTION)
             if not candidate:
                 st.error("Candidate not found")
                 return None
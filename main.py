@@ -6,6 +6,7 @@ from pathlib import Path
 import asyncio
 from datetime import datetime
 import copy
+from contextlib import closing
 from pdf_utils import PDFUtils  # Import the new class
 from docx_utils import DocxUtils # Import the DocxUtils class
 # Import your existing modules
@@ -14,6 +15,7 @@ from llama_resume_parser import ResumeParser
 from standardizer import ResumeStandardizer
 from db_manager import ResumeDBManager
 from OCR_resume_parser import ResumeParserwithOCR
+from ingestion_pipeline import ResumeIngestionPipeline, make_job, employee_id_from_filename
 from final_retriever import run_retriever, render_formatted_resume  # Retriever engine
 from job_matcher import JobMatcher, JobDescriptionAnalyzer  # Import both classes from job_matcher
 import streamlit.components.v1 as components
@@ -233,6 +235,21 @@ if "extracted_keywords" not in st.session_state:
     st.session_state.extracted_keywords = set()
 if "job_matcher_results" not in st.session_state:
     st.session_state.job_matcher_results = []
+if "job_matcher_prescore" not in st.session_state:
+    st.session_state.job_matcher_prescore = None
+
+# Rows of the live ranking shown while bulk matching is still scoring
+LIVE_TOP_N = 10
+
+def show_prescore_cutoff(summary):
+    """Caption with how many candidates the keyword pre-score let through to LLM scoring."""
+    if not summary:
+        return
+    st.caption(
+        f"⚡ LLM-scored {summary['forwarded']} of {summary['candidates']} pre-filtered candidates "
+        f"(top {summary['top_k'] or 'all'}, min pre-score {summary['min_score'] or 0}; "
+        f"cutoff pre-score {summary['cutoff'] if summary['cutoff'] is not None else '-'})"
+    )
 
 # Initialize session state variables if they don't exist
 if 'expander_open_single' not in st.session_state:
@@ -329,6 +346,7 @@ async def standardize_resumes():
     
     total_files = len(st.session_state.processed_files)
     standardized_count = 0
+    cached_count = 0
     
     # Create a copy of processed files list to prevent any potential issues with iteration
     files_to_standardize = list(st.session_state.processed_files)
@@ -339,12 +357,6 @@ async def standardize_resumes():
         # Modify the standardizer to use our temp paths
         output_path = standardized_dir / file_path.name
         
-        if output_path.exists():
-            st.session_state.standardized_files.append(output_path)
-            standardized_count += 1
-            progress_bar.progress((i + 1) / total_files)
-            continue
-        
         try:
             with open(file_path, encoding="utf-8") as f:
                 raw = json.load(f)
@@ -356,17 +368,16 @@ async def standardize_resumes():
                 st.warning(f"Empty content in {file_path.name}, skipping.")
                 continue
             
-            prompt = standardizer.make_standardizer_prompt(content, links)
-            raw_response = await standardizer.call_azure_llm(prompt)
+            # Identical content (under any file name) is served from the standardization cache
+            parsed_json, raw_response, cache_hit = await standardizer.standardize_content(content, links)
+            if cache_hit:
+                cached_count += 1
             
             # Log raw response
             raw_log_path = standardized_dir / f"{file_path.stem}_raw.md"
             with open(raw_log_path, "w", encoding="utf-8") as f:
                 f.write(raw_response)
             
-            cleaned_json = standardizer.clean_llm_response(raw_response)
-            parsed_json = json.loads(cleaned_json)
-            
             # Add timestamp, file source and original filename
             parsed_json["timestamp"] = datetime.now().isoformat()
             parsed_json["source_file"] = str(file_path)
@@ -384,7 +395,9 @@ async def standardize_resumes():
         # Update progress
         progress_bar.progress((i + 1) / total_files)
     
-    status_text.text(f"✅ Standardized {standardized_count}/{total_files} files")
+    status_text.text(
+        f"✅ Standardized {standardized_count}/{total_files} files ({cached_count} reused from cache)"
+    )
     st.session_state.standardizing_complete = True
 
 def convert_objectid_to_str(obj):
@@ -416,22 +429,32 @@ def upload_to_mongodb():
     total_files = len(st.session_state.standardized_files)
     uploaded_count = 0
     
+    # Load every standardized file first, then upsert them all in one batched write
+    loaded_files, resumes = [], []
     for i, file_path in enumerate(st.session_state.standardized_files):
-        status_text.text(f"Uploading {i+1}/{total_files}: {file_path.name}")
-        
+        status_text.text(f"Reading {i+1}/{total_files}: {file_path.name}")
         try:
             with open(file_path, encoding="utf-8") as f:
-                resume_data = json.load(f)
-            
-            # Insert or update in MongoDB
-            db_manager.insert_or_update_resume(resume_data)
-            uploaded_count += 1
-            st.session_state.uploaded_files.append(file_path.name)
+                resumes.append(json.load(f))
+            loaded_files.append(file_path)
         except Exception as e:
-            st.error(f"Error uploading {file_path.name}: {e}")
-        
-        # Update progress
-        progress_bar.progress((i + 1) / total_files)
+            st.error(f"Error reading {file_path.name}: {e}")
+        progress_bar.progress((i + 1) / (total_files * 2))
+    
+    if resumes:
+        status_text.text(f"Uploading {len(resumes)} resumes...")
+        try:
+            outcomes = db_manager.bulk_upsert(resumes)
+        except Exception as e:
+            st.error(f"Error uploading resumes: {e}")
+            outcomes = []
+        for file_path, outcome in zip(loaded_files, outcomes):
+            if outcome["outcome"] == "failed":
+                st.error(f"Error uploading {file_path.name}: {outcome.get('error')}")
+            else:
+                uploaded_count += 1
+                st.session_state.uploaded_files.append(file_path.name)
+    progress_bar.progress(1.0)
     
     status_text.text(f"✅ Uploaded {uploaded_count}/{total_files} resumes to MongoDB")
     st.session_state.db_upload_complete = True
@@ -480,10 +503,7 @@ def validate_and_reprocess_resumes(uploaded_files):
                     standardizer = ResumeStandardizer()
                     content = parsed_resume.get("content", "")
                     links = parsed_resume.get("links", [])
-                    prompt = standardizer.make_standardizer_prompt(content, links)
-                    raw_response = asyncio.run(standardizer.call_azure_llm(prompt))
-                    cleaned_json = standardizer.clean_llm_response(raw_response)
-                    parsed_json = json.loads(cleaned_json)
+                    parsed_json, _, _ = asyncio.run(standardizer.standardize_content(content, links))
 
                     # Add metadata
                     parsed_json["timestamp"] = datetime.now().isoformat()
@@ -502,6 +522,56 @@ def validate_and_reprocess_resumes(uploaded_files):
 
     st.write(f"🔄 Reprocessed {reprocessed_count} resumes with missing 'name'.")
 
+def run_bulk_ingestion(uploaded_files, employee_id_from_name=True):
+    """Run many uploaded resumes through the pipelined parse → standardize → upload engine."""
+    st.session_state.processing_complete = False
+    st.session_state.standardizing_complete = False
+    st.session_state.db_upload_complete = False
+
+    jobs = []
+    for uploaded_file in uploaded_files:
+        temp_file_path = temp_dir / uploaded_file.name
+        with open(temp_file_path, "wb") as f:
+            f.write(uploaded_file.getbuffer())
+        employee_id = employee_id_from_filename(uploaded_file.name) if employee_id_from_name else None
+        jobs.append(make_job(temp_file_path, uploaded_file.name, employee_id))
+
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+
+    def on_progress(job, completed, total):
+        progress_bar.progress(completed / total)
+        outcome = "✅" if job["status"] == "uploaded" else f"❌ failed during {job['stage']}"
+        status_text.text(f"{completed}/{total} done — {job['file_name']} {outcome}")
+
+    try:
+        pipeline = ResumeIngestionPipeline(output_dir=temp_dir, progress_callback=on_progress)
+    except Exception as e:
+        st.error(f"Error initializing ingestion pipeline: {e}")
+        return
+    results = asyncio.run(pipeline.run(jobs))
+
+    uploaded = [job for job in results if job["status"] == "uploaded"]
+    st.session_state.standardized_files = [job["output_path"] for job in uploaded if job["output_path"]]
+    st.session_state.uploaded_files.extend(job["file_name"] for job in uploaded)
+    st.session_state.processing_complete = True
+    st.session_state.standardizing_complete = True
+    st.session_state.db_upload_complete = True
+
+    st.success(
+        f"✅ Uploaded {len(uploaded)}/{len(results)} resumes "
+        f"({sum(1 for job in results if job['cache_hit'])} standardizations reused from cache)"
+    )
+    st.dataframe([
+        {
+            "File": job["file_name"],
+            "Employee ID": job["employee_id"] or "N/A",
+            "Status": job["status"],
+            "Error": f"{job['stage']}: {job['error']}" if job["error"] else "",
+        }
+        for job in results
+    ], use_container_width=True)
+
 # Create temp directories for processing
 temp_dir = Path(tempfile.gettempdir()) / "resume_processor"
 parsed_dir = temp_dir / "parsed"
@@ -555,6 +625,15 @@ elif page == "JD-Resume Regeneration":
             key="bulk_jd"
         )
 
+        col_live1, col_live2 = st.columns([1, 1])
+        with col_live1:
+            live_results = st.checkbox("⚡ Show top candidates while scoring", value=True, key="bulk_live")
+        with col_live2:
+            stop_after = st.number_input(
+                "Stop after this many accepted candidates (0 = score all)",
+                min_value=0, value=0, step=1, key="bulk_stop_after"
+            )
+
         if job_description and st.button("🔍 Find Matching Candidates", type="primary", key="bulk_search"):
             progress = st.progress(0)
             status = st.empty()
@@ -564,23 +643,67 @@ elif page == "JD-Resume Regeneration":
                 analyzer = JobDescriptionAnalyzer()
                 kw = analyzer.extract_keywords(job_description)
                 st.session_state.extracted_keywords = kw["keywords"]
-                results = matcher.find_matching_candidates(
-                    job_description,
-                    progress_bar=progress,
-                    status_text=status
-                )
+                if live_results:
+                    # Clicking Stop reruns the page, which closes the generator and cancels the
+                    # remaining batches; results are saved as they arrive so none are lost
+                    st.button("⏹️ Stop scoring", key="bulk_stop_scoring", help="Keep the candidates scored so far")
+                    live_table = st.empty()
+                    results = []
+                    st.session_state.job_matcher_results = results
+                    with closing(matcher.iter_matching_candidates(
+                        job_description,
+                        progress_bar=progress,
+                        status_text=status,
+                        keywords=kw
+                    )) as scoring:
+                        for cand in scoring:
+                            results = JobMatcher.rank_results(results + [cand])
+                            st.session_state.job_matcher_results = results
+                            st.session_state.job_matcher_prescore = matcher.last_prescore
+                            live_table.dataframe([
+                                {
+                                    "Name": c["name"],
+                                    "Score": c["score"],
+                                    "Pre-score": c["pre_score"],
+                                    "Status": c["status"]
+                                }
+                                for c in results[:LIVE_TOP_N]
+                            ])
+                            accepted_so_far = sum(1 for c in results if c["status"] == "Accepted")
+                            if stop_after and accepted_so_far >= stop_after:
+                                evaluated, total = matcher.scoring_progress
+                                st.info(
+                                    f"⏹️ Stopped after {accepted_so_far} accepted candidates; "
+                                    f"{total - evaluated} of {total} left unscored"
+                                )
+                                break
+                    live_table.empty()
+                else:
+                    results = matcher.find_matching_candidates(
+                        job_description,
+                        progress_bar=progress,
+                        status_text=status,
+                        keywords=kw
+                    )
                 st.session_state.job_matcher_results = results
+                st.session_state.job_matcher_prescore = matcher.last_prescore
             progress.empty()
             status.empty()
 
         if st.session_state.extracted_keywords:
             st.subheader("🔑 Extracted Keywords")
             st.write(", ".join(sorted(st.session_state.extracted_keywords)))
+            cache_info = JobDescriptionAnalyzer.cache_info()
+            st.caption(
+                f"Keyword cache: {cache_info['memory_hits'] + cache_info['persistent_hits']} hits, "
+                f"{cache_info['misses']} misses"
+            )
 
         if st.session_state.job_matcher_results:
             accepted = [c for c in st.session_state.job_matcher_results if c["status"] == "Accepted"]
             if accepted:
                 st.success(f"✅ Found {len(accepted)} matching candidates")
+                show_prescore_cutoff(st.session_state.job_matcher_prescore)
                 st.subheader("📋 Detailed Candidate Profiles")
                 for cand in accepted:
                     resume_key = f'resume_data_{cand["mongo_id"]}'
@@ -600,7 +723,7 @@ elif page == "JD-Resume Regeneration":
                         ]:
                             st.session_state[resume_key].setdefault(field, default)
                     resume_data = st.session_state[resume_key]
-                    with st.expander(f"👤 {cand['name']} - Score: {cand['score']}/100", expanded=False):
+                    with st.expander(f"👤 {cand['name']} - Score: {cand['score']}/100 (pre-score {cand.get('pre_score', 0)})", expanded=False):
                         st.markdown(f"""
                         <div class="card">
                         <div class="candidate-name">{cand['name']}</div>
@@ -608,7 +731,7 @@ elif page == "JD-Resume Regeneration":
                             📧 {cand['email']} | 📱 {cand['phone']}
                         </div>
                         <div class="score-info">
-                            Score: {cand['score']}/100 | 
+                            Score: {cand['score']}/100 | Pre-score: {cand.get('pre_score', 0)} | 
                             Status: <span class="{cand['status'].lower()}">{cand['status']}</span>
                         </div>
                         </div>
@@ -1897,6 +2020,23 @@ elif page == "Database Management":
         else:
             st.info("👆 Please upload a PDF resume file to begin processing")
 
+        # --- Bulk upload through the pipelined ingestion engine ---
+        with st.expander("📦 Bulk Upload (multiple resumes)"):
+            st.markdown("Parsing, standardization and database upload run as overlapping stages, so large batches finish much faster.")
+            bulk_files = st.file_uploader(
+                "📤 Upload Resume Files (PDF or DOCX)",
+                type=["pdf", "docx"],
+                accept_multiple_files=True,
+                key="bulk_resume_uploader"
+            )
+            use_filename_ids = st.checkbox(
+                "Take Employee ID from the trailing number in each file name (e.g. Jane_Doe_900249.pdf)",
+                value=True,
+                key="bulk_employee_id_from_filename"
+            )
+            if bulk_files and st.button("🚀 Process All Resumes", type="primary", use_container_width=True, key="bulk_process"):
+                run_bulk_ingestion(bulk_files, use_filename_ids)
+
         # Display processing status
         st.subheader("📊 Processing Status")
         status_col1, status_col2, status_col3 = st.columns(3)
@@ -2077,6 +2217,7 @@ elif page == "Database Management":
                                                         )
                                                         
                                                         if result.modified_count > 0:
+                                                            db_manager.refresh_resumes({"_id": selected_resume["_id"]})
                                                             st.success("✅ Resume updated successfully!")
                                                             # Reset states and refresh data
                                                             st.session_state.current_view_mode = "list"
@@ -2346,6 +2487,7 @@ def job_matcher_page():
             progress_bar=progress_bar,
             status_text=status_text
         )
+        st.session_state.job_matcher_prescore = matcher.last_prescore
         
         # Clear progress indicators
         progress_bar.empty()
@@ -2354,6 +2496,7 @@ def job_matcher_page():
     # Display results if available
     if st.session_state.job_matcher_results:
         st.write("### Matching Candidates")
+        show_prescore_cutoff(st.session_state.get("job_matcher_prescore"))
         
         # Create a table for all candidates
         candidates_data = []
@@ -2361,6 +2504,7 @@ def job_matcher_page():
             candidates_data.append({
                 "Name": candidate["name"],
                 "Score": f"{candidate['score']}%",
+                "Pre-score": candidate.get("pre_score", 0),
                 "Status": candidate["status"],
                 "Phone": candidate["phone"],
                 "Email": candidate["email"]
@@ -5,6 +5,7 @@ from weasyprint import HTML
 import fitz  # PyMuPDF
 import copy
 import re
+from highlight_utils import get_highlighter
 
 class PDFUtils:
     @staticmethod
@@ -213,30 +214,8 @@ class PDFUtils:
             if not valid_keywords:
                 return text
             
-            # Sort keywords by length (longest first) to avoid partial matches
-            valid_keywords.sort(key=len, reverse=True)
-            
-            # Apply bolding for each keyword
-            for keyword in valid_keywords:
-                # Escape special regex characters
-                escaped_keyword = re.escape(keyword)
-                
-                # Use ONLY word boundary patterns to ensure complete words only
-                patterns = [
-                    # Exact match with word boundaries (case insensitive) - main pattern
-                    r'(?i)(?<!<strong>)\b(' + escaped_keyword + r')\b(?![^<]*</strong>)',
-                    # Match within parentheses with word boundaries like "(RAG)" but not "(leveraged)"
-                    r'(?i)(?<!<strong>)\(\s*(' + escaped_keyword + r')\s*\)(?![^<]*</strong>)',
-                    # Match as standalone word at start/end of text or surrounded by non-alphanumeric
-                    r'(?i)(?<!<strong>)(?<![a-zA-Z0-9])(' + escaped_keyword + r')(?![a-zA-Z0-9])(?![^<]*</strong>)'
-                ]
-                
-                for pattern in patterns:
-                    if re.search(pattern, text):
-                        text = re.sub(pattern, r'<strong>\1</strong>', text)
-                        break
-            
-            return text
+            # Single pass with every keyword; the longest match wins on overlaps
+            return get_highlighter(valid_keywords).wrap(text, '<strong>', '</strong>')
 
         # Create a deep copy and clean NA values to avoid modifying original data
         data_copy = copy.deepcopy(data)
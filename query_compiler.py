@@ -0,0 +1,110 @@
+import re
+from typing import List, Optional, Tuple
+
+from boolean.boolean import Symbol, AND, OR, NOT
+
+from final_retriever import TERM_NODES, quoted_phrase_for
+
+TOKEN_FIELD = "search_tokens"
+
+
+class MongoQueryCompiler:
+    """Translates a boolean.py expression into a MongoDB filter over `search_tokens`.
+
+    Each compiled node is returned with an `exact` flag: True when the filter
+    selects exactly the resumes CompiledQuery would accept, False when it is a
+    superset (quoted phrases and multi-word terms, which only require their
+    pieces to occur in some token). Callers keep running the Python matcher
+    on the returned documents either way. NOT becomes `$nor` over an exact
+    operand; over a superset it cannot be applied and matches everything.
+    """
+
+    def __init__(self, quoted_phrases: Optional[dict] = None, field: str = TOKEN_FIELD):
+        self.quoted_phrases = quoted_phrases or {}
+        self.field = field
+
+    def _substring(self, piece: str) -> dict:
+        return {self.field: {"$regex": re.escape(piece)}}
+
+    def _pieces(self, text: str) -> Tuple[dict, bool]:
+        """Superset filter for phrases: every \\w+ piece occurs inside some token."""
+        pieces = re.findall(r"\w+", text.lower())
+        if not pieces:
+            # Nothing searchable survives normalization, so nothing can match
+            return {"_id": {"$exists": False}}, True
+        clauses = [self._substring(piece) for piece in sorted(set(pieces), key=len, reverse=True)]
+        return (clauses[0] if len(clauses) == 1 else {"$and": clauses}), False
+
+    def symbol(self, symbol: Symbol, word_boundary_only: bool) -> Tuple[dict, bool]:
+        term = str(symbol.obj).lower()
+        phrase = quoted_phrase_for(term, self.quoted_phrases)
+        if phrase is not None:
+            return self._pieces(phrase)
+        if not re.fullmatch(r"\w+", term):
+            return self._pieces(term)
+        # Same policy as CompiledQuery: whole token for AND operands and short terms,
+        # substring of any token for longer terms
+        if word_boundary_only or len(term) <= 4:
+            return {self.field: term}, True
+        return self._substring(term), True
+
+    def negate(self, expr) -> Optional[Tuple[dict, bool]]:
+        part = self.compile(expr.args[0])
+        if part is None:
+            return None
+        clause, exact = part
+        if not exact:
+            # Excluding a superset would drop real matches, so leave the negation to the matcher
+            return {}, False
+        return {"$nor": [clause]}, True
+
+    def _combine(self, operator: str, parts: List[Tuple[dict, bool]]) -> Tuple[dict, bool]:
+        exact = all(part_exact for _, part_exact in parts)
+        if operator == "$or" and any(not clause for clause, _ in parts):
+            return {}, exact
+        parts = [part for part in parts if part[0]]
+        if not parts:
+            return {}, exact
+        # Fold plain token equalities into one $all / $in clause
+        tokens, clauses = [], []
+        for clause, _ in parts:
+            value = clause.get(self.field) if len(clause) == 1 else None
+            if isinstance(value, str):
+                tokens.append(value)
+            else:
+                clauses.append(clause)
+        if tokens:
+            set_operator = "$all" if operator == "$and" else "$in"
+            clauses.insert(0, {self.field: tokens[0]} if len(tokens) == 1 else {self.field: {set_operator: tokens}})
+        if len(clauses) == 1:
+            return clauses[0], exact
+        return {operator: clauses}, exact
+
+    def compile(self, expr, word_boundary_only: bool = False) -> Optional[Tuple[dict, bool]]:
+        """Return (filter, exact), or None if the expression has an unsupported node.
+
+        An empty filter means the expression cannot narrow the collection.
+        """
+        if isinstance(expr, Symbol):
+            return self.symbol(expr, word_boundary_only)
+        if isinstance(expr, NOT):
+            return self.negate(expr)
+        if isinstance(expr, (AND, OR)):
+            parts = []
+            for arg in expr.args:
+                # AND operands that are terms need whole tokens; word_boundary_only is
+                # only ever set on an OR for TermAlternatives
+                if isinstance(expr, AND):
+                    part = self.compile(arg, word_boundary_only=isinstance(arg, TERM_NODES))
+                else:
+                    part = self.compile(arg, word_boundary_only)
+                if part is None:
+                    return None
+                parts.append(part)
+            return self._combine("$and" if isinstance(expr, AND) else "$or", parts)
+        return None
+
+
+def compile_mongo_filter(expr, quoted_phrases: Optional[dict] = None) -> Optional[Tuple[dict, bool]]:
+    """Shortcut for MongoQueryCompiler(quoted_phrases).compile(expr)."""
+    return MongoQueryCompiler(quoted_phrases).compile(expr)
@@ -0,0 +1,336 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from bm25 import CorpusStats, field_lengths
+from final_retriever import is_search_stale, repair_stale_search_fields
+from search_index import _PostingEvaluator
+from term_expansion import closest_terms, trigrams
+
+# What the corpus reads per resume: the search tokens (kept as a set), the BM25F counts
+# and the fields shown before a result is opened. Full documents are still read from
+# MongoDB one page at a time.
+CORPUS_PROJECTION = {"search_tokens": 1, "field_tf": 1, "search_version": 1, "name": 1, "updated_at": 1}
+
+
+class _MemoryPostingEvaluator(_PostingEvaluator):
+    """_PostingEvaluator over the corpus's in-memory posting lists instead of SQLite."""
+
+    def __init__(self, corpus: "ResumeCorpus", quoted_phrases: dict):
+        super().__init__(None, quoted_phrases)
+        self.corpus = corpus
+
+    def exact(self, term: str) -> Set[str]:
+        return self.corpus._postings.get(term, set())
+
+    def substring(self, term: str) -> Set[str]:
+        if term not in self._substring_cache:
+            postings = self.corpus._postings
+            tokens = self.corpus.tokens_containing(term)
+            self._substring_cache[term] = set().union(*(postings[token] for token in tokens))
+        return self._substring_cache[term]
+
+    def all_documents(self) -> Set[str]:
+        return set(self.corpus._entries)
+
+
+class ResumeCorpus:
+    """Process-wide in-memory copy of every resume's search fields and ranking statistics.
+
+    Loaded once, then kept fresh incrementally: a change stream feeds inserts, updates
+    and deletes when the server supports it (replica sets, Atlas); otherwise refresh()
+    polls for resumes whose `updated_at` passed the last one seen and diffs the ids to
+    catch deletes. Also serves as the vocabulary for term_expansion.
+    """
+
+    POLL_INTERVAL_SECONDS = 2
+    # Re-read writes this far behind the watermark to tolerate clock skew between writers
+    WATERMARK_OVERLAP = timedelta(seconds=5)
+    CONTAINING_CACHE_SIZE = 1024
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        # tokens_containing() results, shared by matching and BM25F scoring; reset when the vocabulary changes
+        self._containing: Dict[str, Tuple[str, ...]] = {}
+        self._field_length_totals: Counter = Counter()
+        self._watermark = None
+        self._loaded = False
+        self._last_poll = 0.0
+        self._watcher: Optional[threading.Thread] = None
+        self._pending_repair: Set = set()
+        self.mode = "not loaded"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -------------------
+    # Entries and postings
+    # -------------------
+    @staticmethod
+    def _entry(doc: dict) -> dict:
+        tokens = doc.get("search_tokens") if isinstance(doc.get("search_tokens"), list) else []
+        field_tf = doc.get("field_tf") if isinstance(doc.get("field_tf"), dict) else {}
+        updated_at = doc.get("updated_at")
+        if getattr(updated_at, "tzinfo", None) is not None:
+            # MongoDB hands back naive UTC; locally stamped values are aware
+            updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+        # The token stream itself is not kept: phrases read it from MongoDB (token_streams)
+        return {
+            "_id": doc["_id"],
+            "name": doc.get("name"),
+            "field_tf": field_tf,
+            "stale": is_search_stale(doc),
+            "updated_at": updated_at,
+            "token_set": frozenset(tokens),
+        }
+
+    def _discard(self, doc_id: str):
+        entry = self._entries.pop(doc_id, None)
+        if entry is None:
+            return
+        self._field_length_totals.subtract(field_lengths(entry["field_tf"]))
+        for token in entry["token_set"]:
+            doc_ids = self._postings.get(token)
+            if doc_ids is not None:
+                doc_ids.discard(doc_id)
+                if not doc_ids:
+                    # Its trigram rows stay behind; lookups skip terms without postings
+                    del self._postings[token]
+                    self._containing.clear()
+
+    def _apply(self, doc: dict):
+        doc_id = str(doc["_id"])
+        entry = self._entry(doc)
+        with self._lock:
+            self._discard(doc_id)
+            self._entries[doc_id] = entry
+            self._field_length_totals.update(field_lengths(entry["field_tf"]))
+            for token in entry["token_set"]:
+                if token not in self._postings:
+                    self._postings[token] = set()
+                    self._containing.clear()
+                    for gram in trigrams(token):
+                        self._grams.setdefault(gram, set()).add(token)
+                self._postings[token].add(doc_id)
+            updated_at = entry["updated_at"]
+            if updated_at is not None and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+
+    def _remove(self, doc_id):
+        with self._lock:
+            self._discard(str(doc_id))
+
+    # -------------------
+    # Loading and freshness
+    # -------------------
+    def _open_change_stream(self):
+        pipeline = [{"$project": {
+            "operationType": 1,
+            "documentKey": 1,
+            # A nested $project drops fullDocument._id unless it is kept explicitly
+            "fullDocument._id": 1,
+            **{f"fullDocument.{field}": 1 for field in CORPUS_PROJECTION},
+        }}]
+        try:
+            return self.collection.watch(pipeline, full_document="updateLookup")
+        except Exception as e:
+            # Standalone servers have no change streams
+            print(f"ℹ️ Change streams unavailable, polling updated_at instead: {e}")
+            return None
+
+    def _watch(self, stream):
+        try:
+            with stream:
+                for change in stream:
+                    operation = change.get("operationType")
+                    if operation in ("insert", "update", "replace"):
+                        doc = change.get("fullDocument")
+                        if doc is None:
+                            continue  # deleted again before the lookup
+                        doc.setdefault("_id", change["documentKey"]["_id"])
+                        if is_search_stale(doc):
+                            # Written by an older normalize(); repaired on the next refresh()
+                            self._pending_repair.add(doc["_id"])
+                        self._apply(doc)
+                    elif operation == "delete":
+                        self._remove(change["documentKey"]["_id"])
+                    elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                        self._loaded = False
+                        return
+        except PyMongoError as e:
+            print(f"⚠️ Change stream stopped, falling back to polling: {e}")
+
+    def load(self):
+        """Read every resume's search fields; opens the change stream first so no write is missed."""
+        stream = self._open_change_stream()
+        docs = list(self.collection.find({}, CORPUS_PROJECTION))
+        repair_stale_search_fields(self.collection, docs)
+        with self._lock:
+            self._entries, self._postings, self._grams = {}, {}, {}
+            self._field_length_totals = Counter()
+            self._watermark = None
+            for doc in docs:
+                self._apply(doc)
+        self._loaded = True
+        self._last_poll = time.monotonic()
+        if stream is not None:
+            self._watcher = threading.Thread(target=self._watch, args=(stream,), daemon=True)
+            self._watcher.start()
+            self.mode = "change stream"
+        else:
+            self.mode = "polling"
+        print(f"📚 Loaded {len(docs)} resumes into the in-memory search corpus ({self.mode}).")
+
+    def _sync_ids(self):
+        """Drop resumes deleted from the collection and add any written without updated_at."""
+        ids = {str(doc["_id"]): doc["_id"] for doc in self.collection.find({}, {"_id": 1})}
+        with self._lock:
+            for doc_id in set(self._entries) - set(ids):
+                self._discard(doc_id)
+            missing = [ids[doc_id] for doc_id in set(ids) - set(self._entries)]
+        if missing:
+            docs = list(self.collection.find({"_id": {"$in": missing}}, CORPUS_PROJECTION))
+            repair_stale_search_fields(self.collection, docs)
+            for doc in docs:
+                self._apply(doc)
+
+    def repair(self, doc_ids: Iterable):
+        """Re-normalize stale resumes from fresh copies and swap their entries in under the lock.
+
+        Entries handed out by documents() are shared between sessions and are never
+        modified in place.
+        """
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return
+        docs = list(self.collection.find({"_id": {"$in": doc_ids}}, CORPUS_PROJECTION))
+        repair_stale_search_fields(self.collection, docs)
+        for doc in docs:
+            self._apply(doc)
+
+    def poll(self):
+        """Apply writes since the watermark, then diff ids if the counts disagree."""
+        if self._watermark is None:
+            query = {"updated_at": {"$exists": True}}
+        else:
+            query = {"updated_at": {"$gte": self._watermark - self.WATERMARK_OVERLAP}}
+        docs = list(self.collection.find(query, CORPUS_PROJECTION))
+        repair_stale_search_fields(self.collection, docs)
+        for doc in docs:
+            self._apply(doc)
+        # Deletes leave no timestamp behind
+        if self.collection.estimated_document_count() != len(self._entries):
+            self._sync_ids()
+        self._last_poll = time.monotonic()
+
+    def refresh(self):
+        """Bring the corpus up to date: full load the first time, incremental afterwards."""
+        with self._refresh_lock:
+            if not self._loaded:
+                self.load()
+                return
+            if self._pending_repair:
+                stale_ids, self._pending_repair = list(self._pending_repair), set()
+                self.repair(stale_ids)
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            if self.mode == "change stream":
+                # The stream died: catch up from the watermark and keep polling
+                self.mode = "polling"
+                self._last_poll = 0.0
+            if time.monotonic() - self._last_poll >= self.POLL_INTERVAL_SECONDS:
+                self.poll()
+
+    # -------------------
+    # Querying
+    # -------------------
+    def search(self, expr, quoted_phrases: Optional[dict] = None) -> Set[str]:
+        """Ids of resumes that can satisfy the expression (same contract as ResumeSearchIndex.search)."""
+        with self._lock:
+            evaluator = _MemoryPostingEvaluator(self, quoted_phrases or {})
+            return set(evaluator.evaluate(expr))
+
+    def documents(self, doc_ids: Iterable[str]) -> List[dict]:
+        """Corpus entries (name, field_tf, token set, staleness) for the given ids."""
+        with self._lock:
+            return [self._entries[doc_id] for doc_id in doc_ids if doc_id in self._entries]
+
+    def token_streams(self, ids: Iterable) -> Dict[str, List[str]]:
+        """Stored search_tokens of the given resumes, for queries that match on the joined text."""
+        ids = list(ids)
+        if not ids:
+            return {}
+        return {
+            str(doc["_id"]): doc.get("search_tokens") or []
+            for doc in self.collection.find({"_id": {"$in": ids}}, {"search_tokens": 1})
+        }
+
+    def stats(self) -> CorpusStats:
+        """BM25F statistics over the whole corpus: df from the posting lists, field length totals."""
+        with self._lock:
+            return CorpusStats(
+                len(self._entries),
+                lambda term: len(self._postings.get(term, ())),
+                dict(self._field_length_totals),
+                containing=self.tokens_containing,
+                any_frequency=self._any_frequency,
+            )
+
+    def tokens_containing(self, term: str) -> Tuple[str, ...]:
+        """Vocabulary tokens that contain term, narrowed through the trigram index.
+
+        A token containing term has every trigram inside term among its own, so only
+        the tokens listed under all of them are checked.
+        """
+        with self._lock:
+            tokens = self._containing.get(term)
+            if tokens is None:
+                pools = sorted((self._grams.get(term[i:i + 3], set()) for i in range(len(term) - 2)), key=len)
+                candidates = pools[0].intersection(*pools[1:]) if pools else self._postings
+                tokens = tuple(token for token in candidates if term in token and token in self._postings)
+                if len(self._containing) >= self.CONTAINING_CACHE_SIZE:
+                    self._containing.clear()
+                self._containing[term] = tokens
+            return tokens
+
+    def _any_frequency(self, terms: Iterable[str]) -> int:
+        with self._lock:
+            return len(set().union(*(self._postings.get(term, ()) for term in terms)))
+
+    def has_term(self, term: str) -> bool:
+        return term in self._postings
+
+    def similar_terms(self, term: str, max_edits: int = 1, limit: int = 3) -> List[str]:
+        """Same lookup as ResumeSearchIndex.similar_terms, over the in-memory vocabulary."""
+        min_shared = max(1, len(term) - 4 * max_edits)
+        with self._lock:
+            shared = Counter(token for gram in trigrams(term) for token in self._grams.get(gram, ()))
+            candidates = [
+                (token, len(self._postings[token])) for token, count in shared.items()
+                if count >= min_shared and token in self._postings and abs(len(token) - len(term)) <= max_edits
+            ]
+        return closest_terms(term, candidates, max_edits, limit)
+
+
+_corpora: Dict[tuple, ResumeCorpus] = {}
+_corpora_lock = threading.Lock()
+
+
+def get_resume_corpus(mongo_uri: str, db_name: str, collection_name: str) -> ResumeCorpus:
+    """The process-wide corpus for a collection, shared by every Streamlit session."""
+    key = (mongo_uri, db_name, collection_name)
+    with _corpora_lock:
+        if key not in _corpora:
+            client = MongoClient(mongo_uri)
+            _corpora[key] = ResumeCorpus(client[db_name][collection_name])
+        return _corpora[key]
@@ -5,6 +5,7 @@ import re
 from pymongo import MongoClient
 from dotenv import load_dotenv
 from job_matcher import JobDescriptionAnalyzer, ResumeRetailor
+from final_retriever import DERIVED_FIELDS_PROJECTION
 from docx_utils import DocxUtils
 
 load_dotenv()
@@ -25,7 +26,7 @@ def get_resume_by_employee_id(employee_id):
     client = MongoClient(MONGO_URI)
     db = client[DB_NAME]
     collection = db[COLLECTION_NAME]
-    resume = collection.find_one({"employee_id": employee_id})
+    resume = collection.find_one({"employee_id": employee_id}, DERIVED_FIELDS_PROJECTION)
     if not resume:
         print(f"❌ No resume found for employee_id: {employee_id}")
         sys.exit(1)
@@ -63,6 +64,7 @@ def main():
         analyzer = JobDescriptionAnalyzer()
         keywords_result = analyzer.extract_keywords(job_description)
         keywords = keywords_result["keywords"]
+        print(f"🔑 Keyword cache: {JobDescriptionAnalyzer.cache_info()}")
         retailor = ResumeRetailor()
         retailored_resume = retailor.retailor_resume(resume, keywords, job_description)
     else:
@@ -0,0 +1,382 @@
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson.objectid import ObjectId
+from boolean.boolean import Symbol, AND, OR, NOT
+
+from bm25 import CorpusStats, field_lengths, field_term_counts
+from final_retriever import NORMALIZE_VERSION, TERM_NODES, compute_search_tokens
+from term_expansion import closest_terms, trigrams
+
+
+class ResumeSearchIndex:
+    """On-disk inverted index (term -> resume ids) for the Boolean search engine.
+
+    Terms are the exact tokens produced by final_retriever.normalize(), including
+    its merged bigrams, so a query answered here selects the same candidates that
+    evaluate_expression would accept on the normalized text. The terms table
+    doubles as the corpus vocabulary, with a trigram table for fuzzy lookups, and
+    per-resume field lengths make it a source of BM25F statistics.
+    """
+
+    SCHEMA_VERSION = "3"
+    INDEX_DIR = Path("data2/search_index")
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            self._create_schema(conn)
+
+    @classmethod
+    def for_collection(cls, db_name: str, collection_name: str) -> "ResumeSearchIndex":
+        """Return the index file that belongs to a MongoDB collection."""
+        safe_name = re.sub(r"[^\w.-]", "_", f"{db_name}.{collection_name}")
+        return cls(cls.INDEX_DIR / f"{safe_name}.sqlite3")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        version = f"{self.SCHEMA_VERSION}:{NORMALIZE_VERSION}"
+        row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row and row[0] != version:
+            # Token rules changed: drop everything and let the next query rebuild it
+            for table in ("terms", "postings", "documents", "trigrams", "field_lengths"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, doc_id TEXT NOT NULL, PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY) WITHOUT ROWID")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS trigrams ("
+            "gram TEXT NOT NULL, term TEXT NOT NULL, PRIMARY KEY (gram, term)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS field_lengths ("
+            "doc_id TEXT NOT NULL, field TEXT NOT NULL, length INTEGER NOT NULL, "
+            "PRIMARY KEY (doc_id, field)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+            (version,)
+        )
+
+    # -------------------
+    # Indexing
+    # -------------------
+    @staticmethod
+    def document_terms(doc: dict) -> Set[str]:
+        """Tokenize a resume exactly like the retriever does at query time."""
+        return set(compute_search_tokens(doc))
+
+    @staticmethod
+    def _add_field_lengths(conn, doc_id: str, doc: dict):
+        # Resumes are indexed without their derived fields, so count the fields here
+        conn.executemany(
+            "INSERT OR REPLACE INTO field_lengths (doc_id, field, length) VALUES (?, ?, ?)",
+            ((doc_id, field, length) for field, length in field_lengths(field_term_counts(doc)).items())
+        )
+
+    @staticmethod
+    def _add_trigrams(conn, terms: Iterable[str]):
+        # Rows of terms that later drop out of the corpus stay behind; lookups join
+        # against the terms table, and rebuild() clears them
+        conn.executemany(
+            "INSERT OR IGNORE INTO trigrams (gram, term) VALUES (?, ?)",
+            ((gram, term) for term in terms for gram in trigrams(term))
+        )
+
+    def _remove(self, conn, doc_id: str):
+        conn.execute(
+            "UPDATE terms SET df = df - 1 WHERE term IN (SELECT term FROM postings WHERE doc_id = ?)",
+            (doc_id,)
+        )
+        conn.execute("DELETE FROM terms WHERE df <= 0")
+        conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM field_lengths WHERE doc_id = ?", (doc_id,))
+
+    def add_document(self, doc: dict):
+        """Insert or replace the postings of a single resume."""
+        doc_id = str(doc.get("_id"))
+        terms = self.document_terms(doc)
+        with self._connect() as conn:
+            self._remove(conn, doc_id)
+            conn.executemany(
+                "INSERT INTO postings (term, doc_id) VALUES (?, ?)",
+                ((term, doc_id) for term in terms)
+            )
+            new_terms = [
+                term for term in terms
+                if conn.execute("SELECT 1 FROM terms WHERE term = ?", (term,)).fetchone() is None
+            ]
+            conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                ((term,) for term in terms)
+            )
+            self._add_trigrams(conn, new_terms)
+            conn.execute("INSERT INTO documents (doc_id) VALUES (?)", (doc_id,))
+            self._add_field_lengths(conn, doc_id, doc)
+
+    def remove_document(self, doc_id):
+        """Drop a resume from every posting list."""
+        with self._connect() as conn:
+            self._remove(conn, str(doc_id))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM postings")
+            conn.execute("DELETE FROM terms")
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM trigrams")
+            conn.execute("DELETE FROM field_lengths")
+
+    def rebuild(self, docs: Iterable[dict]) -> int:
+        """Rebuild the whole index from an iterable of resumes (e.g. a Mongo cursor)."""
+        doc_freq: Dict[str, int] = {}
+        count = 0
+        with self._connect() as conn:
+            conn.execute("DELETE FROM postings")
+            conn.execute("DELETE FROM terms")
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM trigrams")
+            conn.execute("DELETE FROM field_lengths")
+            for doc in docs:
+                doc_id = str(doc.get("_id"))
+                terms = self.document_terms(doc)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO postings (term, doc_id) VALUES (?, ?)",
+                    ((term, doc_id) for term in terms)
+                )
+                conn.execute("INSERT OR IGNORE INTO documents (doc_id) VALUES (?)", (doc_id,))
+                self._add_field_lengths(conn, doc_id, doc)
+                for term in terms:
+                    doc_freq[term] = doc_freq.get(term, 0) + 1
+                count += 1
+            conn.executemany("INSERT INTO terms (term, df) VALUES (?, ?)", doc_freq.items())
+            self._add_trigrams(conn, doc_freq)
+        print(f"🗂️ Rebuilt search index with {count} resumes and {len(doc_freq)} terms.")
+        return count
+
+    def doc_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def is_synced(self, collection) -> bool:
+        """Cheap freshness check against the collection's document count."""
+        count = self.doc_count()
+        return count > 0 and count == collection.estimated_document_count()
+
+    def stats(self) -> CorpusStats:
+        """BM25F statistics over every indexed resume: df from the terms table, field length totals."""
+        with self._connect() as conn:
+            doc_count = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            totals = dict(conn.execute("SELECT field, SUM(length) FROM field_lengths GROUP BY field").fetchall())
+        return CorpusStats(
+            doc_count, self.document_frequency, totals,
+            containing=self.terms_containing,
+            any_frequency=self.any_frequency,
+        )
+
+    def document_frequency(self, term: str) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+        return row[0] if row else 0
+
+    def any_frequency(self, terms: Iterable[str]) -> int:
+        """Number of resumes holding any of the terms."""
+        terms = list(terms)
+        if not terms:
+            return 0
+        placeholders = ",".join("?" * len(terms))
+        with self._connect() as conn:
+            return conn.execute(
+                f"SELECT COUNT(DISTINCT doc_id) FROM postings WHERE term IN ({placeholders})", terms
+            ).fetchone()[0]
+
+    def terms_containing(self, term: str) -> List[str]:
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT term FROM terms WHERE instr(term, ?) > 0", (term,))]
+
+    # -------------------
+    # Vocabulary
+    # -------------------
+    def has_term(self, term: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM terms WHERE term = ?", (term,)).fetchone() is not None
+
+    def similar_terms(self, term: str, max_edits: int = 1, limit: int = 3) -> List[str]:
+        """The closest corpus terms within max_edits of term, most frequent first.
+
+        Candidates come from the trigram table: an edit changes at most four of a
+        term's padded trigrams (a transposition), so a match shares at least
+        len(term) - 4 * max_edits of them.
+        """
+        grams = sorted(trigrams(term))
+        min_shared = max(1, len(term) - 4 * max_edits)
+        placeholders = ",".join("?" * len(grams))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT t.term, t.df FROM trigrams g JOIN terms t ON t.term = g.term "
+                f"WHERE g.gram IN ({placeholders}) AND length(t.term) BETWEEN ? AND ? "
+                "GROUP BY t.term HAVING COUNT(*) >= ?",
+                (*grams, len(term) - max_edits, len(term) + max_edits, min_shared)
+            ).fetchall()
+        return closest_terms(term, rows, max_edits, limit)
+
+    # -------------------
+    # Querying
+    # -------------------
+    def search(self, expr, quoted_phrases: Optional[dict] = None) -> Set[str]:
+        """Return ids of resumes that can satisfy the Boolean expression.
+
+        Plain terms are answered exactly from the posting lists using the same
+        word-boundary / substring rules as evaluate_expression; quoted phrases
+        and multi-word terms return a superset (all their tokens present), so
+        callers should still run evaluate_expression on the returned resumes.
+        NOT subtracts exact postings; a NOT over a superset is left unapplied.
+        """
+        quoted_phrases = quoted_phrases or {}
+        with self._connect() as conn:
+            evaluator = _PostingEvaluator(conn, quoted_phrases)
+            return evaluator.evaluate(expr)
+
+
+class _PostingEvaluator:
+    """Evaluates a boolean.py expression tree with posting-list set algebra."""
+
+    def __init__(self, conn, quoted_phrases: dict):
+        self.conn = conn
+        self.quoted_phrases = quoted_phrases
+        self._exact_cache: Dict[str, Set[str]] = {}
+        self._substring_cache: Dict[str, Set[str]] = {}
+        self._all_documents: Optional[Set[str]] = None
+
+    def exact(self, term: str) -> Set[str]:
+        if term not in self._exact_cache:
+            rows = self.conn.execute("SELECT doc_id FROM postings WHERE term = ?", (term,))
+            self._exact_cache[term] = {row[0] for row in rows}
+        return self._exact_cache[term]
+
+    def substring(self, term: str) -> Set[str]:
+        """Resumes with any indexed token containing the term (covers the exact token too)."""
+        if term not in self._substring_cache:
+            rows = self.conn.execute(
+                "SELECT DISTINCT p.doc_id FROM terms t JOIN postings p ON p.term = t.term "
+                "WHERE instr(t.term, ?) > 0",
+                (term,)
+            )
+            self._substring_cache[term] = {row[0] for row in rows}
+        return self._substring_cache[term]
+
+    def all_documents(self) -> Set[str]:
+        """Every indexed resume id, the universe a standalone NOT is complemented against."""
+        if self._all_documents is None:
+            rows = self.conn.execute("SELECT doc_id FROM documents")
+            self._all_documents = {row[0] for row in rows}
+        return self._all_documents
+
+    def all_tokens(self, text: str) -> Set[str]:
+        """Superset for phrases and multi-word terms: every \\w+ piece must occur in some token."""
+        pieces = re.findall(r"\w+", text.lower())
+        if not pieces:
+            return set()
+        result = None
+        for piece in sorted(pieces, key=len, reverse=True):
+            postings = self.substring(piece)
+            result = set(postings) if result is None else result & postings
+            if not result:
+                break
+        return result
+
+    def phrase(self, term: str) -> Optional[Set[str]]:
+        """Candidates for a quoted-phrase placeholder, or None if the term is not one."""
+        for placeholder, phrase in self.quoted_phrases.items():
+            if placeholder.lower() == term:
+                return self.all_tokens(phrase)
+        return None
+
+    def symbol(self, term: str, word_boundary_only: bool) -> Tuple[Set[str], bool]:
+        candidates = self.phrase(term)
+        if candidates is not None:
+            return candidates, False
+        if not re.fullmatch(r"\w+", term):
+            return self.all_tokens(term), False
+        # Mirrors evaluate_expression: short terms (and AND operands) need a whole
+        # token, longer terms also fall back to substring matches.
+        if word_boundary_only or len(term) <= 4:
+            return self.exact(term), True
+        return self.substring(term), True
+
+    def _negate(self, expr) -> Tuple[Set[str], bool]:
+        """Postings of a NOT operand; only an exact operand can be subtracted."""
+        postings, exact = self.evaluate_exact(expr.args[0])
+        return (postings if exact else set()), exact
+
+    def evaluate_exact(self, expr, word_boundary_only: bool = False) -> Tuple[Set[str], bool]:
+        """Return (ids, exact): exact is False when ids are a superset of the true matches."""
+        if isinstance(expr, Symbol):
+            return self.symbol(str(expr.obj).lower(), word_boundary_only)
+
+        if isinstance(expr, NOT):
+            excluded, exact = self._negate(expr)
+            return self.all_documents() - excluded, exact
+
+        if isinstance(expr, AND):
+            positives = [arg for arg in expr.args if not isinstance(arg, NOT)]
+            negatives = [arg for arg in expr.args if isinstance(arg, NOT)]
+            result, exact = None, True
+            for arg in positives:
+                postings, arg_exact = self.evaluate_exact(arg, word_boundary_only=isinstance(arg, TERM_NODES))
+                exact = exact and arg_exact
+                result = set(postings) if result is None else result & postings
+                if not result:
+                    return set(), exact
+            if result is None:
+                result = set(self.all_documents())
+            # AND-NOT is a set difference, no complement of the whole corpus needed
+            for arg in negatives:
+                excluded, arg_exact = self._negate(arg)
+                exact = exact and arg_exact
+                result -= excluded
+                if not result:
+                    break
+            return result, exact
+
+        if isinstance(expr, OR):
+            result: Set[str] = set()
+            exact = True
+            for arg in expr.args:
+                # word_boundary_only is only ever set for TermAlternatives
+                postings, arg_exact = self.evaluate_exact(arg, word_boundary_only)
+                exact = exact and arg_exact
+                result |= postings
+            return result, exact
+
+        return set(), True
+
+    def evaluate(self, expr, word_boundary_only: bool = False) -> Set[str]:
+        return self.evaluate_exact(expr, word_boundary_only)[0]
+
+def mongo_ids(doc_ids: Iterable[str]) -> List:
+    """Turn indexed string ids back into values usable in a Mongo `_id` $in filter."""
+    values = []
+    for doc_id in doc_ids:
+        values.append(doc_id)
+        if ObjectId.is_valid(doc_id):
+            values.append(ObjectId(doc_id))
+    return values
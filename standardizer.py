@@ -1,12 +1,21 @@
 import os
 import json
+import hashlib
 from pathlib import Path
+from typing import Tuple
 import httpx
 import asyncio
 import streamlit as st  # Added for secrets access
 import re
+from cache_utils import SQLiteCache
 
 class ResumeStandardizer:
+    # Bump whenever _prompt_template changes so cached results from the old prompt are not reused
+    PROMPT_VERSION = "1"
+    CACHE_PATH = Path("data2/cache/standardizer_cache.sqlite3")
+    CACHE_MAX_ENTRIES = 5000
+    CACHE_MAX_AGE_DAYS = 90
+
     def __init__(self):
         self.api_key = st.secrets["azure_openai"]["api_key"]
         self.endpoint = st.secrets["azure_openai"]["endpoint"]
@@ -22,6 +31,13 @@ class ResumeStandardizer:
         self.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         self.RAW_LOG_DIR.mkdir(parents=True, exist_ok=True)
 
+        self.cache = SQLiteCache(
+            self.CACHE_PATH,
+            table="standardized_resumes",
+            max_entries=self.CACHE_MAX_ENTRIES,
+            max_age_seconds=self.CACHE_MAX_AGE_DAYS * 24 * 3600
+        )
+
     def preprocess_content(self, content: str) -> str:
         """Clean up OCR artifacts and page markers that might cause content shifting."""
         if not content:
@@ -47,6 +63,34 @@ class ResumeStandardizer:
         cleaned_content = self.preprocess_content(content)
         return self._prompt_template(cleaned_content, links)
     
+    def cache_key(self, cleaned_content: str, links: list) -> str:
+        """Content hash of everything that determines the LLM output."""
+        payload = json.dumps({
+            "content": cleaned_content,
+            "links": links,
+            "prompt_version": self.PROMPT_VERSION,
+            "deployment": self.deployment,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def standardize_content(self, content: str, links: list) -> Tuple[dict, str, bool]:
+        """Standardize parsed resume content, reusing cached results for identical input.
+
+        Returns (parsed_json, raw_response, cache_hit).
+        """
+        cleaned_content = self.preprocess_content(content)
+        key = self.cache_key(cleaned_content, links)
+
+        raw_response = self.cache.get(key)
+        if raw_response is not None:
+            return json.loads(self.clean_llm_response(raw_response)), raw_response, True
+
+        raw_response = await self.call_azure_llm(self._prompt_template(cleaned_content, links))
+        parsed_json = json.loads(self.clean_llm_response(raw_response))
+        # Only cache responses that parsed, so a malformed answer is retried next time
+        self.cache.set(key, raw_response, tag=self.PROMPT_VERSION)
+        return parsed_json, raw_response, False
+
     def _prompt_template(self, content, links):
         return f"""
 You are an intelligent and robust context-aware resume standardizer. Your task is to convert resume content into a clean, structured, normalized/standardized JSON format suitable for both semantic retrieval and relational database storage.
@@ -164,10 +208,6 @@ The quality of your standardization directly impacts downstream processing. Ensu
         output_path = self.OUTPUT_DIR / file_path.name
         raw_log_path = self.RAW_LOG_DIR / file_path.name.replace(".json", ".md")
 
-        if output_path.exists():
-            print(f"⏩ Skipping {file_path.name} (already standardized)")
-            return
-
         with open(file_path, encoding="utf-8") as f:
             raw = json.load(f)
 
@@ -178,18 +218,15 @@ The quality of your standardization directly impacts downstream processing. Ensu
             print(f"⚠️ Empty content in {file_path.name}, skipping.")
             return
 
-        prompt = self.make_standardizer_prompt(content, links)
-
         try:
             print(f"🔍 Standardizing: {file_path.name}")
-            raw_response = await self.call_azure_llm(prompt)
+            parsed_json, raw_response, cache_hit = await self.standardize_content(content, links)
+            if cache_hit:
+                print(f"⏩ Reusing cached standardization for {file_path.name}")
 
             with open(raw_log_path, "w", encoding="utf-8") as f:
                 f.write(raw_response)
 
-            cleaned_json = self.clean_llm_response(raw_response)
-            parsed_json = json.loads(cleaned_json)
-
             with open(output_path, "w", encoding="utf-8") as f:
                 json.dump(parsed_json, f, indent=2, ensure_ascii=False)
 
@@ -197,8 +234,13 @@ The quality of your standardization directly impacts downstream processing. Ensu
         except Exception as e:
             print(f"❌ Failed to standardize {file_path.name}: {e}")
 
-    async def run(self):
+    async def run(self, max_concurrency: int = 8):
         files = list(self.INPUT_DIR.glob("*.json"))
         print(f"📂 Found {len(files)} resumes to standardize.\n")
-        for file in files:
-            await self.standardize_resume(file)
\ No newline at end of file
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def standardize_bounded(file):
+            async with semaphore:
+                await self.standardize_resume(file)
+
+        await asyncio.gather(*(standardize_bounded(file) for file in files))
@@ -0,0 +1,163 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from boolean.boolean import Symbol, AND, OR, NOT
+
+from final_retriever import TermAlternatives, canonical_phrase, quoted_phrase_for, tokenize
+
+# Curated alias groups: every spelling in a group finds resumes that use any other.
+# Write entries as they appear in resumes; alias_term() turns them into search terms.
+SYNONYM_GROUPS = [
+    ("Kubernetes", "k8s"),
+    ("JavaScript", "JS", "ECMAScript"),
+    ("TypeScript", "TS"),
+    ("Node.js", "Node"),
+    ("React", "React.js", "ReactJS"),
+    ("Vue", "Vue.js"),
+    ("Angular", "AngularJS"),
+    ("Next.js", "NextJS"),
+    ("PostgreSQL", "Postgres", "psql"),
+    ("MongoDB", "Mongo"),
+    ("Machine Learning", "ML"),
+    ("Artificial Intelligence", "AI"),
+    ("Natural Language Processing", "NLP"),
+    ("Large Language Models", "Large Language Model", "LLM", "LLMs"),
+    ("Generative AI", "GenAI"),
+    ("Amazon Web Services", "AWS"),
+    ("Google Cloud Platform", "Google Cloud", "GCP"),
+    ("Microsoft Azure", "Azure"),
+    ("CI/CD", "Continuous Integration"),
+    ("scikit-learn", "sklearn"),
+    ("PyTorch", "torch"),
+    ("REST API", "RESTful API", "REST APIs"),
+]
+
+# Typo tolerance only for terms long enough that one edit is still unambiguous
+FUZZY_MIN_LENGTH = 5
+FUZZY_MAX_ALTERNATIVES = 3
+
+
+def alias_term(text: str) -> str:
+    """Search term for an alias: the merged token normalize() produces for one or two
+    words ("Node.js" -> "nodejs"), the plain lowercase words for longer phrases."""
+    words = tokenize(text, bigrams=False)
+    return "".join(words) if len(words) <= 2 else " ".join(words)
+
+
+@lru_cache(maxsize=1)
+def synonym_table() -> Dict[str, Set[str]]:
+    """canonical_phrase(spelling) -> search terms of the whole alias group."""
+    table: Dict[str, Set[str]] = {}
+    for group in SYNONYM_GROUPS:
+        terms = {alias_term(spelling) for spelling in group}
+        for spelling in group:
+            table.setdefault(canonical_phrase(spelling), set()).update(terms)
+    return table
+
+
+def synonyms_for(term: str) -> Set[str]:
+    """Other search terms that mean the same as term (empty if it has no alias group)."""
+    aliases = synonym_table().get(canonical_phrase(term), set())
+    return {alias for alias in aliases if alias != term.lower()}
+
+
+def trigrams(term: str) -> Set[str]:
+    """Character trigrams of a term padded with '$', the keys of the vocabulary lookup."""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting an adjacent transposition ("pyhton") as one edit;
+    returns limit + 1 as soon as it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit and min(previous) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def closest_terms(term: str, candidates: Iterable[Tuple[str, int]], max_edits: int, limit: int) -> List[str]:
+    """From (vocabulary term, document frequency) pairs, the terms at the smallest edit
+    distance (1..max_edits) from term, most frequent first."""
+    scored = []
+    for candidate, df in candidates:
+        distance = edit_distance(term, candidate, max_edits)
+        if 0 < distance <= max_edits:
+            scored.append((distance, -df, candidate))
+    if not scored:
+        return []
+    # Only the best distance: a farther match is usually a merged bigram of the closer one
+    best = min(distance for distance, _, _ in scored)
+    return [candidate for distance, _, candidate in sorted(scored) if distance == best][:limit]
+
+
+def max_edits(term: str) -> int:
+    if len(term) < FUZZY_MIN_LENGTH:
+        return 0
+    return 1 if len(term) <= 8 else 2
+
+
+class QueryExpander:
+    """Rewrites each query term into the term plus its aliases and close vocabulary terms.
+
+    Aliases come from SYNONYM_GROUPS; spelling variants come from the corpus vocabulary
+    of a ResumeSearchIndex (its trigram table), and are only looked up for terms that
+    do not occur in the corpus themselves. Quoted phrases are left as typed.
+    """
+
+    def __init__(self, quoted_phrases: Optional[dict] = None, vocabulary=None):
+        self.quoted_phrases = quoted_phrases or {}
+        self.vocabulary = vocabulary
+        self.expansions: Dict[str, List[str]] = {}
+
+    def alternatives(self, term: str) -> List[str]:
+        if quoted_phrase_for(term, self.quoted_phrases) is not None:
+            return []
+        found = synonyms_for(term)
+        edits = max_edits(term)
+        if self.vocabulary is not None and edits and re.fullmatch(r"\w+", term):
+            if not self.vocabulary.has_term(term):
+                found.update(self.vocabulary.similar_terms(term, edits, FUZZY_MAX_ALTERNATIVES))
+        found.discard(term)
+        return sorted(found)
+
+    def expand(self, expr):
+        if isinstance(expr, Symbol):
+            term = str(expr.obj).lower()
+            alternatives = self.alternatives(term)
+            if not alternatives:
+                return expr
+            self.expansions[term] = alternatives
+            return TermAlternatives(expr, *(Symbol(alternative) for alternative in alternatives))
+        if isinstance(expr, NOT):
+            return NOT(self.expand(expr.args[0]))
+        if isinstance(expr, (AND, OR)):
+            return type(expr)(*(self.expand(arg) for arg in expr.args))
+        return expr
+
+
+def expand_query(expr, quoted_phrases: Optional[dict] = None, vocabulary=None):
+    """Return (expanded expression, {term: alternatives added})."""
+    expander = QueryExpander(quoted_phrases, vocabulary)
+    return expander.expand(expr), expander.expansions
+
+
+def expand_keywords(keywords: Iterable[str]) -> Set[str]:
+    """Keywords plus the aliases of each, for skill lookups outside the Boolean search."""
+    expanded = set()
+    for keyword in keywords or []:
+        if isinstance(keyword, str) and keyword.strip():
+            expanded.add(keyword)
+            expanded.update(synonyms_for(keyword))
+    return expanded
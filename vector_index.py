@@ -0,0 +1,319 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import streamlit as st
+
+from final_retriever import tokenize
+
+# Resume sections that describe what a candidate can do; contact details and the like are left out
+EMBEDDING_FIELDS = ("skills", "project_titles", "projects", "experience", "summary")
+EMBEDDING_PROJECTION = {"skills": 1, "projects": 1, "experience": 1, "summary": 1, "updated_at": 1}
+EMBED_BATCH_SIZE = 64
+# Azure embedding models accept about 8k tokens; keep well inside that
+MAX_EMBEDDING_CHARS = 12000
+
+
+def semantic_settings() -> dict:
+    """The optional [semantic_search] secrets section (top_n, provider)."""
+    try:
+        return dict(st.secrets.get("semantic_search", {}))
+    except Exception:
+        return {}
+
+
+def semantic_top_n() -> Optional[int]:
+    """How many candidates the semantic stage passes to the LLM scorer; None when it is off."""
+    top_n = semantic_settings().get("top_n")
+    return int(top_n) if top_n else None
+
+
+def resume_embedding_text(resume: dict) -> str:
+    """Skills, projects, experience and summary of a resume as one text to embed."""
+    from bm25 import field_texts
+    texts = field_texts(resume)
+    return " ".join(texts[field] for field in EMBEDDING_FIELDS if texts.get(field))[:MAX_EMBEDDING_CHARS]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class HashingEmbedder:
+    """Offline stand-in for an embedding model: signed feature hashing of normalize() tokens.
+
+    Deterministic across processes and needs no network, so semantic retrieval can run
+    (and be tested) without Azure; similarity is lexical rather than semantic.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token, count in Counter(tokenize(text)).items():
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign * (1.0 + math.log(count))
+        return vector
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize_rows(np.stack([self._features(text) for text in texts]))
+
+
+class AzureEmbedder:
+    """Embeddings from an Azure OpenAI deployment (azure_openai.embedding_deployment)."""
+
+    def __init__(self, deployment: str):
+        from openai import AzureOpenAI
+        self.client = AzureOpenAI(
+            api_key=st.secrets["azure_openai"]["api_key"],
+            api_version=st.secrets["azure_openai"]["api_version"],
+            azure_endpoint=st.secrets["azure_openai"]["endpoint"]
+        )
+        self.deployment = deployment
+        self.name = "azure-" + re.sub(r"[^\w.-]", "_", deployment)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = [text[:MAX_EMBEDDING_CHARS] or " " for text in texts[start:start + EMBED_BATCH_SIZE]]
+            response = self.client.embeddings.create(model=self.deployment, input=batch)
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize_rows(np.asarray(rows, dtype=np.float32))
+
+
+_embedder = None
+
+
+def get_embedder():
+    """Azure embeddings when a deployment is configured, else the offline HashingEmbedder."""
+    global _embedder
+    if _embedder is None:
+        deployment = None
+        try:
+            deployment = st.secrets["azure_openai"].get("embedding_deployment")
+        except Exception:
+            pass
+        if deployment and semantic_settings().get("provider", "azure") != "hashing":
+            _embedder = AzureEmbedder(deployment)
+        else:
+            _embedder = HashingEmbedder()
+        print(f"🧭 Semantic retrieval embedder: {_embedder.name}")
+    return _embedder
+
+
+class VectorIndex:
+    """Flat, L2-normalized embedding matrix of resumes with batched cosine top-N search.
+
+    One row per resume id, keyed by a hash of the embedded text so unchanged resumes
+    are never re-embedded. Saved as a .npz file next to the search index, and kept in
+    step with MongoDB by the ingestion writes (upsert/remove) and by sync(), which
+    polls `updated_at` like the in-memory search corpus.
+    """
+
+    INDEX_DIR = Path("data2/vector_index")
+    # Re-read writes this far behind the watermark to tolerate clock skew between writers
+    WATERMARK_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, path, embedder):
+        self.path = Path(path)
+        self.embedder = embedder
+        self._lock = threading.RLock()
+        self.ids: List[str] = []
+        self.hashes: List[str] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._positions: Dict[str, int] = {}
+        self._watermark = None
+        self._load()
+
+    @classmethod
+    def for_collection(cls, db_name: str, collection_name: str, embedder=None) -> "VectorIndex":
+        embedder = embedder or get_embedder()
+        safe_name = re.sub(r"[^\w.-]", "_", f"{db_name}.{collection_name}.{embedder.name}")
+        return cls(cls.INDEX_DIR / f"{safe_name}.npz", embedder)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # -------------------
+    # Persistence
+    # -------------------
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.ids = [str(i) for i in data["ids"]]
+                self.hashes = [str(h) for h in data["hashes"]]
+                self.matrix = data["matrix"].astype(np.float32)
+                watermark = str(data["watermark"]) if "watermark" in data else ""
+            self._watermark = datetime.fromisoformat(watermark) if watermark else None
+            self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        except Exception as e:
+            print(f"⚠️ Could not load vector index {self.path}, rebuilding it: {e}")
+            self.ids, self.hashes, self._positions = [], [], {}
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp.npz")
+        with self._lock:
+            np.savez(
+                tmp_path,
+                ids=np.array(self.ids, dtype=str),
+                hashes=np.array(self.hashes, dtype=str),
+                matrix=self.matrix,
+                watermark=np.array(self._watermark.isoformat() if self._watermark else ""),
+            )
+        tmp_path.replace(self.path)
+
+    # -------------------
+    # Maintenance
+    # -------------------
+    def upsert(self, docs: Iterable[dict], save: bool = True) -> int:
+        """Embed new or changed resumes in batches; returns how many were embedded.
+
+        The watermark only moves once the vectors are in the matrix, so writes whose
+        embedding failed are read again by the next sync().
+        """
+        pending: Dict[str, Tuple[str, str]] = {}
+        watermark = None
+        docs = list(docs)
+        with self._lock:
+            known = {doc_id: self.hashes[position] for doc_id, position in self._positions.items()}
+        for doc in docs:
+            doc_id = str(doc.get("_id"))
+            text = resume_embedding_text(doc)
+            content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if known.get(doc_id) != content_hash:
+                pending[doc_id] = (text, content_hash)
+            updated_at = doc.get("updated_at")
+            if isinstance(updated_at, datetime):
+                if updated_at.tzinfo is not None:
+                    # MongoDB hands back naive UTC; locally stamped values are aware
+                    updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+                if watermark is None or updated_at > watermark:
+                    watermark = updated_at
+        if pending:
+            doc_ids = list(pending)
+            vectors = self.embedder.embed([pending[doc_id][0] for doc_id in doc_ids])
+        with self._lock:
+            if pending:
+                if self.matrix.shape[1] != vectors.shape[1]:
+                    # First rows (or a model with another dimension): start a fresh matrix
+                    self.ids, self.hashes, self._positions = [], [], {}
+                    self.matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+                new_rows = []
+                for doc_id, vector in zip(doc_ids, vectors):
+                    position = self._positions.get(doc_id)
+                    if position is None:
+                        self._positions[doc_id] = len(self.ids)
+                        self.ids.append(doc_id)
+                        self.hashes.append(pending[doc_id][1])
+                        new_rows.append(vector)
+                    else:
+                        self.matrix[position] = vector
+                        self.hashes[position] = pending[doc_id][1]
+                if new_rows:
+                    self.matrix = np.vstack([self.matrix, np.asarray(new_rows, dtype=np.float32)])
+            if watermark is not None and (self._watermark is None or watermark > self._watermark):
+                self._watermark = watermark
+        if pending and save:
+            self.save()
+        return len(pending)
+
+    def remove(self, doc_ids: Iterable, save: bool = True):
+        with self._lock:
+            drop = {str(doc_id) for doc_id in doc_ids} & set(self._positions)
+            if not drop:
+                return
+            keep = [i for i, doc_id in enumerate(self.ids) if doc_id not in drop]
+            self.ids = [self.ids[i] for i in keep]
+            self.hashes = [self.hashes[i] for i in keep]
+            self.matrix = self.matrix[keep]
+            self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        if save:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self.ids, self.hashes, self._positions = [], [], {}
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            self._watermark = None
+        self.save()
+
+    def sync(self, collection) -> int:
+        """Embed resumes written since the watermark and drop deleted ones; returns how many were embedded."""
+        if self._watermark is None or not self.ids:
+            docs = collection.find({}, EMBEDDING_PROJECTION)
+        else:
+            docs = collection.find(
+                {"updated_at": {"$gte": self._watermark - self.WATERMARK_OVERLAP}}, EMBEDDING_PROJECTION
+            )
+        embedded = self.upsert(docs, save=False)
+        # Deletes leave no timestamp behind, and resumes written without one are not seen above
+        if collection.estimated_document_count() != len(self.ids):
+            ids = {str(doc["_id"]): doc["_id"] for doc in collection.find({}, {"_id": 1})}
+            with self._lock:
+                indexed = set(self.ids)
+            self.remove(indexed - set(ids), save=False)
+            with self._lock:
+                missing = [ids[doc_id] for doc_id in set(ids) - set(self._positions)]
+            if missing:
+                embedded += self.upsert(collection.find({"_id": {"$in": missing}}, EMBEDDING_PROJECTION), save=False)
+        self.save()
+        return embedded
+
+    # -------------------
+    # Querying
+    # -------------------
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embedder.embed([text[:MAX_EMBEDDING_CHARS]])[0]
+
+    def search(self, vector: np.ndarray, top_n: int, candidate_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Top-N (id, cosine similarity) pairs, optionally only among candidate_ids."""
+        with self._lock:
+            if not self.ids or top_n <= 0:
+                return []
+            if candidate_ids is None:
+                rows = np.arange(len(self.ids))
+            else:
+                rows = np.array(sorted(self._positions[i] for i in set(candidate_ids) if i in self._positions), dtype=int)
+                if rows.size == 0:
+                    return []
+            scores = self.matrix[rows] @ vector
+            ids = self.ids
+        if top_n < len(scores):
+            best = np.argpartition(-scores, top_n - 1)[:top_n]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(ids[rows[i]], float(scores[i])) for i in best]
+
+
+_vector_indexes: Dict[tuple, VectorIndex] = {}
+_vector_indexes_lock = threading.Lock()
+
+
+def get_vector_index(db_name: str, collection_name: str) -> VectorIndex:
+    """The process-wide vector index for a collection, shared by ingestion and the job matcher."""
+    key = (db_name, collection_name)
+    with _vector_indexes_lock:
+        if key not in _vector_indexes:
+            _vector_indexes[key] = VectorIndex.for_collection(db_name, collection_name)
+        return _vector_indexes[key]